@@ -1,289 +1,687 @@
-<<<<<<< HEAD
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, send_file, stream_with_context
+from werkzeug.utils import secure_filename
 from flask_cors import CORS
 import cv2
-import mediapipe as mp
 import os
-=======
-from flask import Flask, jsonify
-import cv2
-import mediapipe as mp
-import os
-import math
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
+import json
+import hashlib
 import logging
+import time
+import uuid
 import numpy as np
-import threading
+from functools import lru_cache, partial
+from job_queue import JobQueue, QueueFullError, JobCancelled, JOB_DONE, JOB_FAILED, JOB_CANCELLED
+from video_pipeline import FrameReader
+from frame_sampler import AdaptiveSampler
+from roi_cropper import PoseCropper
+from quality_tiers import QUALITY_TIERS, DEFAULT_TIER, PosePool, tier_settings
+from reference_library import ReferenceLibrary
+from bulk_comparison import ReferenceBank, DEFAULT_TOP_K
+from extract_features_from_videos import ARM_LANDMARKS, extract_hand_vectors
+from comparison import calculate_hand_vector, analyze_vectors, compare_vectors
+from live_session import LiveSession, LiveSessionRegistry, TooManySessionsError, LIVE_LATENCY_BUDGET_MS
+from metrics import REGISTRY, stage_seconds, frames_total, queue_depth
+from process_video import create_pose, landmarks_to_array, NUM_LANDMARKS, LANDMARK_FIELDS
+from render_video import render_video, save_landmarks, load_landmarks
+from chunked_processing import process_in_chunks, CHUNK_SECONDS, MIN_CHUNK_SECONDS
 
-<<<<<<< HEAD
 # Flask app initialization
 app = Flask(__name__)
 CORS(app)
-=======
-app = Flask(__name__)
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
 
 # Initialize logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
 
-<<<<<<< HEAD
-# Mediapipe setup
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=False,
-    model_complexity=1,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# Log progress every this many frames (at debug level) instead of on every frame
+PROGRESS_LOG_INTERVAL = 300
 
-# Output path
-output_video_path = r'D:\Temp downloads\testout.mp4'
+# Per-request metrics, labelled by route (not by URL, so job IDs don't create new series)
+request_seconds = REGISTRY.histogram(
+    'proformai_request_seconds', 'Time spent handling HTTP requests', ['endpoint'])
+requests_total = REGISTRY.counter(
+    'proformai_requests_total', 'HTTP requests handled', ['endpoint', 'status'])
 
 # Folder to store uploads
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-=======
-# Initialize mediapipe pose detection with lower complexity for better performance
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=False,  # Set to False for videos
-    model_complexity=1,       # Lower complexity for faster performance
-    min_detection_confidence=0.5,  # Adjust detection confidence
-    min_tracking_confidence=0.5    # Adjust tracking confidence
-)
-
-# Set the output video path
-output_video_path = r'D:\Temp downloads\testout.mp4'
-
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-# Function to process video and extract pose landmarks
-def process_video(file_path, output_writer=None, frame_skip=2):
-    video = cv2.VideoCapture(file_path)
-    vectors = []
-<<<<<<< HEAD
+# Folders that video paths given in a request may point into. Uploads are
+# always allowed; more folders can be listed in PROFORMAI_VIDEO_ROOTS (os.pathsep-separated)
+VIDEO_ROOTS = [UPLOAD_FOLDER] + [root for root in os.environ.get('PROFORMAI_VIDEO_ROOTS', '').split(os.pathsep) if root]
 
-=======
-    
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-    if not video.isOpened():
-        logging.error(f"Could not open video file: {file_path}")
-        return vectors
+# Folder for per-job analysis landmarks and rendered videos
+OUTPUT_FOLDER = 'outputs'
+os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-    frame_count = 0
-<<<<<<< HEAD
-=======
+# Background job settings: number of worker threads and how many jobs may wait
+JOB_WORKERS = int(os.environ.get('PROFORMAI_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.environ.get('PROFORMAI_JOB_QUEUE_SIZE', 8))
 
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-    while video.isOpened():
-        ret, frame = video.read()
-        if not ret:
-            break
+# Rendering jobs run on their own, smaller queue so they never hold up analysis
+RENDER_WORKERS = int(os.environ.get('PROFORMAI_RENDER_WORKERS', 1))
+RENDER_QUEUE_SIZE = int(os.environ.get('PROFORMAI_RENDER_QUEUE_SIZE', 4))
 
-        frame_count += 1
-<<<<<<< HEAD
-        if frame_count % frame_skip != 0:
-            continue
+# Maximum number of concurrent live webcam sessions
+LIVE_MAX_SESSIONS = int(os.environ.get('PROFORMAI_LIVE_MAX_SESSIONS', 4))
 
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(image_rgb)
+# Live sessions are interactive, so they use the fastest tier unless asked otherwise
+LIVE_DEFAULT_TIER = 'fast'
 
-        if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
-=======
-        logging.info(f"Processing frame {frame_count}")  # Log the progress
+# Pose instances per quality tier shared by all requests and jobs, and the
+# tiers whose instances are created and warmed up at server start
+POSE_POOL_SIZE = int(os.environ.get('PROFORMAI_POSE_POOL_SIZE', JOB_WORKERS))
+PREWARM_TIERS = [tier for tier in os.environ.get('PROFORMAI_PREWARM_TIERS', DEFAULT_TIER).split(',') if tier]
 
-        # Skip frames for faster processing
-        if frame_count % frame_skip != 0:
-            continue
+pose_pool = PosePool(create_pose, size=POSE_POOL_SIZE, prewarm=PREWARM_TIERS)
 
-        # Convert the frame to RGB
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+# Live sessions hold their Pose instance while they are open, so they have a pool
+# of their own with one instance per session, warmed up for the live tiers at server start
+LIVE_PREWARM_TIERS = [tier for tier in os.environ.get('PROFORMAI_LIVE_PREWARM_TIERS', LIVE_DEFAULT_TIER).split(',') if tier]
 
-        # Process the image and extract pose landmarks
-        results = pose.process(image_rgb)
+live_pose_pool = PosePool(create_pose, size=LIVE_MAX_SESSIONS, prewarm=LIVE_PREWARM_TIERS)
 
-        # Calculate joint vectors if pose landmarks are detected
-        if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
+# Default professional video used as the reference
+DEFAULT_REFERENCE_VIDEO_PATH = r'D:\Temp downloads\p2copy.mp4'
 
-            # Get the vectors representing hand movement
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-            hand_vector = calculate_hand_vector(landmarks)
-            if hand_vector is not None:
-                vectors.append(hand_vector)
+# Exercise compared against when a request names neither an exercise nor a reference video
+DEFAULT_EXERCISE_ID = 'bicep_curl'
 
-<<<<<<< HEAD
-            draw_landmarks(frame, results.pose_landmarks)
+# Precomputed reference templates, loaded once at server start
+reference_library = ReferenceLibrary().load()
 
-=======
-            # Draw the pose landmarks on the frame
-            draw_landmarks(frame, results.pose_landmarks)
+# The first rep of every template, normalized and stacked for matching against all references at once
+reference_bank = ReferenceBank.from_library(reference_library)
 
-        # Write frame to output video if an output writer is provided
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-        if output_writer:
-            output_writer.write(frame)
+# Function to analyze a video: run pose estimation and extract hand vectors.
+# Nothing is drawn or encoded here; the returned landmarks can be rendered
+# later by a render job (see render_video.py). Returns a dict with
+#   vectors:       hand vectors of the frames where a pose was found
+#   frame_numbers: 1-based numbers of the analysed frames
+#   landmarks:     (len(frame_numbers), 33, 4) array, NaN where no pose was found
+#   fps:           frame rate of the video, to turn frame numbers into times
+# Decoding runs on its own thread, connected by a bounded queue (see video_pipeline.py).
+# The quality tier sets the Pose model, sampling rate and inference width; without
+# a pose_instance (which must match the tier) one is borrowed from the pool.
+def analyze_video(file_path, tier=DEFAULT_TIER, pose_instance=None, cancel_event=None):
+    if pose_instance is None:
+        with pose_pool.acquire(tier) as pooled_pose:
+            return analyze_video(file_path, tier, pooled_pose, cancel_event)
 
-    video.release()
-    return vectors
+    settings = tier_settings(tier)
 
-<<<<<<< HEAD
-# Function to calculate hand movement vectors
-=======
-# Function to calculate the vector representing hand movement
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-def calculate_hand_vector(landmarks):
-    def create_vector(a, b):
-        return np.array([b[0] - a[0], b[1] - a[1]])
+    video = cv2.VideoCapture(file_path)
+    vectors = []
+    frame_numbers = []
+    landmarks_list = []
+    no_pose = np.full((NUM_LANDMARKS, LANDMARK_FIELDS), np.nan, dtype=np.float32)
+
+    if not video.isOpened():
+        logging.error(f"Could not open video file: {file_path}")
+        return {'vectors': vectors, 'frame_numbers': np.array(frame_numbers, dtype=np.int64),
+                'landmarks': np.empty((0, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32), 'fps': 0.0}
+
+    # Sample frames at roughly target_hz, more often during fast motion
+    fps = video.get(cv2.CAP_PROP_FPS)
+    sampler = AdaptiveSampler(fps, settings['target_hz'])
+
+    # Run pose inference on a downscaled crop around the person (see roi_cropper.py)
+    cropper = PoseCropper(settings['inference_width'])
+
+    reader = FrameReader(video).start()
 
     try:
-<<<<<<< HEAD
-        shoulder = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-        elbow = [landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].y]
-        wrist = [landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].x, landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].y]
-
-        upper_arm_vector = create_vector(shoulder, elbow)
-        lower_arm_vector = create_vector(elbow, wrist)
-
-=======
-        # Get coordinates for shoulder, elbow, and wrist
-        shoulder = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                    landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-        elbow = [landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].x,
-                 landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].y]
-        wrist = [landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].x,
-                 landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].y]
-
-        # Create vectors representing arm movement
-        upper_arm_vector = create_vector(shoulder, elbow)
-        lower_arm_vector = create_vector(elbow, wrist)
-
-        # Return the vectors for further comparison
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-        return (upper_arm_vector, lower_arm_vector)
-
-    except IndexError as e:
-        logging.error(f"Error calculating hand vector: {str(e)}")
-        return None
-
-<<<<<<< HEAD
-# Function to draw landmarks on the frame
-def draw_landmarks(frame, pose_landmarks):
-    mp_drawing = mp.solutions.drawing_utils
-    mp_drawing_styles = mp.solutions.drawing_styles
-=======
-# Function to draw pose landmarks on the frame
-def draw_landmarks(frame, pose_landmarks):
-    mp_drawing = mp.solutions.drawing_utils
-    mp_drawing_styles = mp.solutions.drawing_styles
-
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-    mp_drawing.draw_landmarks(
-        frame,
-        pose_landmarks,
-        mp_pose.POSE_CONNECTIONS,
-<<<<<<< HEAD
-        landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
-    )
-
-# Home route
-=======
-        landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style())
+        for frame_count, frame in reader:
+            # Stop early if the job running this video was cancelled
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled()
+
+            if frame_count % PROGRESS_LOG_INTERVAL == 0:
+                logging.debug(f"Processing frame {frame_count} of {file_path}")
+            queue_depth.set(reader.queue_depth(), 'decode')
+
+            # Skip frames for faster processing
+            if not sampler.should_sample(frame_count):
+                frames_total.inc('skipped')
+                continue
+
+            # Crop, downscale and convert the frame to RGB
+            with stage_seconds.time('preprocess'):
+                image_rgb = cropper.prepare(frame)
+
+            # Process the image and extract pose landmarks, mapped back to full-frame coordinates
+            with stage_seconds.time('pose_process'):
+                results = cropper.finish(pose_instance.process(image_rgb))
+            frames_total.inc('sampled' if results.pose_landmarks else 'no_pose')
+            frame_numbers.append(frame_count)
+
+            # Calculate joint vectors if pose landmarks are detected
+            if results.pose_landmarks:
+                landmarks = results.pose_landmarks.landmark
+                keypoints = landmarks_to_array(results.pose_landmarks)
+                landmarks_list.append(keypoints)
+
+                # Get the vectors representing hand movement
+                hand_vector = calculate_hand_vector(landmarks)
+                if hand_vector is not None:
+                    vectors.append(hand_vector)
+
+                sampler.update(frame_count, keypoints)
+            else:
+                landmarks_list.append(no_pose)
+                sampler.update(frame_count, None)
+    finally:
+        reader.stop()
+        video.release()
+
+    return {
+        'vectors': vectors,
+        'frame_numbers': np.array(frame_numbers, dtype=np.int64),
+        'landmarks': np.array(landmarks_list, dtype=np.float32).reshape(-1, NUM_LANDMARKS, LANDMARK_FIELDS),
+        'fps': fps,
+    }
+
+# Function to get only the hand vectors of a video
+def process_video(file_path, tier=DEFAULT_TIER, pose_instance=None, cancel_event=None):
+    return analyze_video(file_path, tier, pose_instance, cancel_event)['vectors']
 
 # Define a root route to test if the Flask app is running
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
 @app.route('/')
 def home():
     return "Flask app is running!"
 
-<<<<<<< HEAD
-# Route to handle video uploads
+# Function to save an upload under the hash of its content. The client's file
+# name is only used (sanitized) for the extension, and uploading the same video
+# again lands on the same path, so its checkpoints are found again.
+def save_upload(upload, block_size=1 << 20):
+    extension = os.path.splitext(secure_filename(upload.filename or ''))[1].lower() or '.mp4'
+    tmp_path = os.path.join(UPLOAD_FOLDER, f'{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    with open(tmp_path, 'wb') as f:
+        for block in iter(lambda: upload.stream.read(block_size), b''):
+            digest.update(block)
+            f.write(block)
+
+    video_path = os.path.join(UPLOAD_FOLDER, digest.hexdigest() + extension)
+    os.replace(tmp_path, video_path)
+    return video_path
+
+# Function to read a video path from a request, `default` when it has none.
+# Relative paths, such as the upload names /process-video returns, are looked up in
+# UPLOAD_FOLDER. Raises ValueError for a path outside VIDEO_ROOTS.
+def requested_video_path(params, name, default=None):
+    if name not in params:
+        return default
+    path = params[name]
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"{name} must be a non-empty string")
+
+    resolved = os.path.realpath(os.path.join(UPLOAD_FOLDER, path))
+    for root in VIDEO_ROOTS:
+        root = os.path.realpath(root)
+        if os.path.commonpath([resolved, root]) == root:
+            return resolved
+    raise ValueError(f"{name} must be an uploaded video")
+
+# Function to read the JSON body of a request: {} without one, None when it isn't a JSON object
+def request_params():
+    params = request.get_json(silent=True)
+    if params is None and not request.get_data():
+        return {}
+    return params if isinstance(params, dict) else None
+
+# Function to parse a request value as a finite number above zero, raises ValueError otherwise
+def positive_number(value, name):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = float('nan')
+    if not 0 < number < float('inf'):
+        raise ValueError(f"{name} must be a positive number")
+    return number
+
+# Function to read the quality tier of a request, raises ValueError for an unknown tier
+def requested_tier(params, default=DEFAULT_TIER):
+    tier = params.get('tier') or default
+    tier_settings(tier)
+    return tier
+
+# Route to handle video uploads. The video is processed in time windows of
+# chunk_seconds (form field), at the quality tier given by the optional
+# 'tier' form field, and the result is streamed back as JSON lines,
+# one line per window with its hand vectors, then a final summary line.
+# Finished windows are checkpointed, so after a crash or restart uploading the
+# same video again resumes at the first unfinished window.
 @app.route('/process-video', methods=['POST'])
 def process_video_route():
     if 'video' not in request.files:
         return jsonify({'error': 'No video file uploaded'}), 400
 
-    video = request.files['video']
-    video_path = os.path.join(UPLOAD_FOLDER, video.filename)
-    video.save(video_path)
-
-    # Perform the analysis
-    analysis_result = process_video(video_path)
-    return jsonify({'analysis': analysis_result})
-
-# Compare hand vectors
-=======
-# Function to handle video processing in the background
-def process_videos_in_background(user_video_path, reference_video_path):
-    # Open the output video writer
-    user_video = cv2.VideoCapture(user_video_path)
-    width = int(user_video.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(user_video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = user_video.get(cv2.CAP_PROP_FPS)
-    output_writer = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
-    user_video.release()
-
-    # Process the user's video and the professional reference video
-    user_angles = process_video(user_video_path, output_writer)
-    reference_angles = process_video(reference_video_path, output_writer)
-
-    # Close the output video writer
-    output_writer.release()
+    try:
+        tier = requested_tier(request.form)
+        chunk_seconds = positive_number(request.form.get('chunk_seconds', CHUNK_SECONDS), 'chunk_seconds')
+        if chunk_seconds < MIN_CHUNK_SECONDS:
+            raise ValueError(f"chunk_seconds must be at least {MIN_CHUNK_SECONDS}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Check that the upload is a video before streaming, and don't keep it if it isn't
+    video_path = save_upload(request.files['video'])
+    video = cv2.VideoCapture(video_path)
+    readable = video.isOpened() and video.read()[0]
+    video.release()
+    if not readable:
+        os.remove(video_path)
+        return jsonify({'error': 'Could not read the uploaded video'}), 400
+
+    # The request's metrics are recorded when the stream ends, not when this route returns
+    g.streamed_request = True
+
+    def generate():
+        windows = vectors = 0
+        try:
+            # The response is streamed after this route returns, so the Pose instance is borrowed here
+            with pose_pool.acquire(tier) as chunk_pose:
+                for window in process_in_chunks(video_path, chunk_pose, chunk_seconds, tier=tier):
+                    windows += 1
+                    vectors += len(window['vectors'])
+                    yield json.dumps({
+                        'window': window['window'],
+                        'start_time': round(window['start_time'], 3),
+                        'end_time': round(window['end_time'], 3),
+                        'resumed': window['resumed'],
+                        'vectors': np.round(window['vectors'], 5).tolist(),
+                    }) + '\n'
+            yield json.dumps({'done': True, 'video': os.path.basename(video_path), 'tier': tier,
+                              'windows': windows, 'vector_count': vectors}) + '\n'
+        except Exception as e:
+            logging.exception(f"Processing {video_path} failed")
+            yield json.dumps({'error': str(e)}) + '\n'
+        finally:
+            record_request(request.endpoint, g.request_start, 200)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Function to pick the reference for a request. Returns (template, None) when the
+# request names a template or an exercise (or the default exercise has a template),
+# otherwise (None, reference_video_path). An exercise with several templates is
+# compared against the first by template ID. Raises KeyError (with the message for
+# the client) for an unknown template or exercise and ValueError for a reference
+# video outside VIDEO_ROOTS.
+def resolve_reference(params):
+    template_id = params.get('template_id')
+    if template_id is not None:
+        template = reference_library.get(template_id) if isinstance(template_id, str) else None
+        if template is None:
+            raise KeyError(f"Unknown template: {template_id}")
+        return template, None
+
+    exercise_id = params.get('exercise_id')
+    if exercise_id is None and 'reference_video_path' not in params and DEFAULT_EXERCISE_ID in reference_library:
+        exercise_id = DEFAULT_EXERCISE_ID
+
+    if exercise_id is not None:
+        templates = reference_library.for_exercise(exercise_id)
+        if not templates:
+            raise KeyError(f"Unknown exercise: {exercise_id}")
+        return templates[0], None
+
+    return None, requested_video_path(params, 'reference_video_path', DEFAULT_REFERENCE_VIDEO_PATH)
+
+# Function to handle video processing in the background.
+# Runs on a job queue worker with a Pose instance of the requested tier from the
+# pool. With a reference template only the user's video goes through pose estimation.
+# The user's landmarks are saved to landmarks_path so the job can be rendered later.
+def process_videos_in_background(cancel_event, user_video_path, reference_video_path=None,
+                                 reference_template=None, landmarks_path=None, tier=DEFAULT_TIER):
+    with pose_pool.acquire(tier) as pose_instance:
+        # Analyze the user's video, and the professional reference video if there is no template
+        user_analysis = analyze_video(user_video_path, tier, pose_instance, cancel_event)
+        if reference_template is not None:
+            reference_angles = reference_template.vectors
+        else:
+            # Don't carry the tracking state of the user's video over to the reference
+            pose_instance.reset()
+            reference_angles = process_video(reference_video_path, tier, pose_instance, cancel_event)
+
+    if landmarks_path is not None:
+        save_landmarks(landmarks_path, user_video_path, user_analysis['frame_numbers'], user_analysis['landmarks'])
+
+    # The user's vectors come from the frames with a pose, from the same arm as the
+    # template, and are timed by their frame numbers (sampling is adaptive, not uniform)
+    landmarks = user_analysis['landmarks']
+    with_pose = ~np.isnan(landmarks[:, 0, 0])
+    side = reference_template.side if reference_template is not None else 'left'
+    user_angles = extract_hand_vectors(landmarks[with_pose], side)
+    timestamps = user_analysis['frame_numbers'][with_pose] / (user_analysis['fps'] or 30)
 
     # Compare angles
     if len(user_angles) == 0 or len(reference_angles) == 0:
-        logging.error('Could not analyze the video due to insufficient data.')
-    else:
-        min_length = min(len(user_angles), len(reference_angles))
-        feedback = compare_vectors(user_angles[:min_length], reference_angles[:min_length])
-        logging.info(f"Video processing complete. Feedback: {feedback}")
-
-# Route to compare the two specific videos and generate a visual output
+        raise ValueError('Could not analyze the video due to insufficient data.')
+
+    # Time-align the two sequences instead of comparing frame i with frame i
+    result = analyze_vectors(user_angles, reference_angles, timestamps=timestamps)
+    logging.info(f"Video processing complete. Feedback: {result['feedback']}")
+
+    result['tier'] = tier
+    if reference_template is not None:
+        result['exercise_id'] = reference_template.exercise_id
+        result['template_id'] = reference_template.template_id
+    return result
+
+# Function to find the references closest to a user's video in the background.
+# The user's landmarks are compared against every template in one vectorized pass,
+# and saved to landmarks_path so the job can be rendered later.
+def match_in_background(cancel_event, user_video_path, top_k=DEFAULT_TOP_K,
+                        side='left', tier=DEFAULT_TIER, landmarks_path=None):
+    with pose_pool.acquire(tier) as pose_instance:
+        user_analysis = analyze_video(user_video_path, tier, pose_instance, cancel_event)
+
+    if landmarks_path is not None:
+        save_landmarks(landmarks_path, user_video_path, user_analysis['frame_numbers'], user_analysis['landmarks'])
+
+    with stage_seconds.time('match'):
+        matches = reference_bank.compare(user_analysis['landmarks'], top_k=top_k, side=side)
+    if not matches:
+        raise ValueError('Could not analyze the video due to insufficient data.')
+
+    return {'matches': matches, 'references': len(reference_bank), 'tier': tier}
+
+# Function to render an analysed video in the background from its saved landmarks
+def render_in_background(cancel_event, landmarks_path, output_path, scale=1.0):
+    video_path, frame_numbers, landmarks = load_landmarks(landmarks_path)
+    with stage_seconds.time('render'):
+        return render_video(video_path, output_path, frame_numbers, landmarks,
+                            scale=scale, cancel_event=cancel_event)
+
+# Function to delete the landmarks a comparison or match job saved, once the job is forgotten
+def remove_job_landmarks(job):
+    landmarks_path = job.kwargs.get('landmarks_path')
+    if landmarks_path is not None and os.path.exists(landmarks_path):
+        os.remove(landmarks_path)
+
+# Job queue for comparisons, the jobs borrow Pose instances from the pool
+job_queue = JobQueue(num_workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, on_prune=remove_job_landmarks)
+REGISTRY.gauge('proformai_job_queue_depth', 'Jobs waiting for a worker', callback=job_queue.queue_depth)
+
+# Job queue for rendering annotated videos, no Pose instance needed
+render_queue = JobQueue(num_workers=RENDER_WORKERS, max_queued=RENDER_QUEUE_SIZE)
+REGISTRY.gauge('proformai_render_queue_depth', 'Render jobs waiting for a worker', callback=render_queue.queue_depth)
+
+# Function to find a job on either queue
+def find_job(job_id):
+    return job_queue.get(job_id) or render_queue.get(job_id)
+
+# Route to queue a comparison of a user video against a professional video
 @app.route('/compare-videos', methods=['GET', 'POST'])
 def compare_videos():
-    user_video_path = r'D:\Temp downloads\f1.mp4'  # Path to the user's video
-    reference_video_path = r'D:\Temp downloads\p2copy.mp4'  # Path to the professional video
-
-    # Start the video processing in a background thread
-    thread = threading.Thread(target=process_videos_in_background, args=(user_video_path, reference_video_path))
-    thread.start()
-
-    return jsonify({'message': 'Video processing started in the background.'})
-
-# Compare user's hand vectors with reference hand vectors
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-def compare_vectors(user_vectors, reference_vectors):
-    feedback = ''
-    vector_diffs = []
-
-    for user_vector, ref_vector in zip(user_vectors, reference_vectors):
-        upper_arm_diff = np.linalg.norm(user_vector[0] - ref_vector[0])
-        lower_arm_diff = np.linalg.norm(user_vector[1] - ref_vector[1])
-<<<<<<< HEAD
-        vector_diff = (upper_arm_diff + lower_arm_diff) / 2
-        vector_diffs.append(vector_diff)
-
-    avg_vector_diff = sum(vector_diffs) / len(vector_diffs) if vector_diffs else 0
-    if avg_vector_diff > 0.1:
-        feedback = f"Your hand movement is off by {avg_vector_diff:.2f}. Try to match the professional's form."
-    else:
-        feedback = "Your hand movement looks good!"
-=======
-        
-        # Combine the difference of both vectors for the arm
-        vector_diff = (upper_arm_diff + lower_arm_diff) / 2
-        vector_diffs.append(vector_diff)
-
-    # Provide feedback based on average vector difference
-    avg_vector_diff = sum(vector_diffs) / len(vector_diffs) if vector_diffs else 0
-    if avg_vector_diff > 0.1:  # Tweak the threshold as needed for sensitivity
-        feedback = f"Your hand movement is off by an average of {avg_vector_diff:.2f}. Try to match the professional's form."
+    params = request_params()
+    if params is None:
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    # Reference template by exercise ID, or the path of a professional video
+    try:
+        # Path to the user's video
+        user_video_path = requested_video_path(params, 'user_video_path', r'D:\Temp downloads\f1.mp4')
+        reference_template, reference_video_path = resolve_reference(params)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Quality tier: fast, balanced or accurate
+    try:
+        tier = requested_tier(params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job = job_queue.submit(process_videos_in_background, user_video_path,
+                               reference_video_path=reference_video_path,
+                               reference_template=reference_template,
+                               landmarks_path=os.path.join(OUTPUT_FOLDER, f'{uuid.uuid4().hex}.npz'),
+                               tier=tier)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+
+    return jsonify({'message': 'Video processing queued.', 'job_id': job.id}), 202
+
+# Route to check the status of a queued job
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+# Route to fetch the result of a finished job
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status == JOB_DONE:
+        return jsonify({'job_id': job.id, 'result': job.result})
+    if job.status == JOB_FAILED:
+        return jsonify(job.to_dict()), 500
+    if job.status == JOB_CANCELLED:
+        return jsonify(job.to_dict()), 409
+    # Still queued or running
+    return jsonify(job.to_dict()), 202
+
+# Route to cancel a queued or running job
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    queue = job_queue if job_queue.get(job_id) else render_queue
+    if queue.get(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if not queue.cancel(job_id):
+        return jsonify({'error': 'Job already finished'}), 409
+    return jsonify(queue.get(job_id).to_dict())
+
+# Route to queue rendering of an annotated video for a finished comparison or match job.
+# Optional JSON: {"scale": 0.5} to downscale the output.
+@app.route('/jobs/<job_id>/render', methods=['POST'])
+def render_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status != JOB_DONE:
+        return jsonify({'error': 'Job has not finished successfully'}), 409
+    if job.kwargs.get('landmarks_path') is None:
+        return jsonify({'error': 'Job has no landmarks to render'}), 409
+
+    params = request_params()
+    if params is None:
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    try:
+        scale = positive_number(params.get('scale', 1.0), 'scale')
+    except ValueError:
+        scale = None
+    if scale is None or scale > 1:
+        return jsonify({'error': 'scale must be in (0, 1]'}), 400
+
+    output_path = os.path.join(OUTPUT_FOLDER, f'{job.id}_{scale:g}.mp4')
+    try:
+        render = render_queue.submit(render_in_background, job.kwargs['landmarks_path'], output_path, scale=scale)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+
+    return jsonify({'message': 'Rendering queued.', 'job_id': render.id}), 202
+
+# Route to download the video of a finished render job
+@app.route('/jobs/<job_id>/video', methods=['GET'])
+def job_video(job_id):
+    job = render_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown render job'}), 404
+    if job.status != JOB_DONE:
+        return jsonify(job.to_dict()), 409
+    return send_file(os.path.abspath(job.result['output_path']), mimetype='video/mp4')
+
+# Function to get the hand vectors of a reference video, processed once per path and tier
+@lru_cache(maxsize=8)
+def load_reference_vectors(reference_video_path, tier=DEFAULT_TIER):
+    return process_video(reference_video_path, tier)
+
+live_sessions = LiveSessionRegistry(max_sessions=LIVE_MAX_SESSIONS)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# Function to record the time and status of one request
+def record_request(endpoint, start, status_code):
+    request_seconds.observe(time.perf_counter() - start, endpoint or 'unknown')
+    requests_total.inc(endpoint or 'unknown', str(status_code))
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    # Streamed responses record their own metrics once the stream is done
+    if start is not None and not g.get('streamed_request'):
+        record_request(request.endpoint, start, response.status_code)
+    return response
+
+# Route to expose the counters and timings in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# Route to list the reference templates
+@app.route('/references', methods=['GET'])
+def list_references():
+    return jsonify({'references': reference_library.templates()})
+
+# Route to queue a match of a user video against every reference template
+@app.route('/references/match', methods=['POST'])
+def match_references():
+    params = request_params()
+    if params is None:
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    if len(reference_bank) == 0:
+        return jsonify({'error': 'No reference templates to match against'}), 404
+
+    try:
+        user_video_path = requested_video_path(params, 'user_video_path')
+        if user_video_path is None:
+            raise ValueError('user_video_path is required')
+        tier = requested_tier(params)
+        top_k = int(params.get('top_k', DEFAULT_TOP_K))
+        if top_k < 1:
+            raise ValueError('top_k must be at least 1')
+        side = params.get('side', 'left')
+        if side not in ARM_LANDMARKS:
+            raise ValueError(f"side must be one of: {', '.join(ARM_LANDMARKS)}")
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job = job_queue.submit(match_in_background, user_video_path, top_k=top_k, side=side, tier=tier,
+                               landmarks_path=os.path.join(OUTPUT_FOLDER, f'{uuid.uuid4().hex}.npz'))
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+
+    return jsonify({'message': 'Reference matching queued.', 'job_id': job.id}), 202
+
+# Route to list the quality tiers and how many Pose instances each has in the pool
+@app.route('/tiers', methods=['GET'])
+def list_tiers():
+    return jsonify({'tiers': QUALITY_TIERS, 'default': DEFAULT_TIER, 'live_default': LIVE_DEFAULT_TIER,
+                    'pool': pose_pool.stats(), 'live_pool': live_pose_pool.stats()})
+
+# Route to open a live webcam session
+@app.route('/live/sessions', methods=['POST'])
+def create_live_session():
+    params = request_params()
+    if params is None:
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    try:
+        reference_template, reference_video_path = resolve_reference(params)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        tier = requested_tier(params, LIVE_DEFAULT_TIER)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Track the same arm as the template; reference videos are compared on the left arm
+    side = 'left'
+    if reference_template is not None:
+        reference_vectors = reference_template.vectors
+        side = reference_template.side
     else:
-        feedback = "Your hand movement looks good!"
+        reference_vectors = load_reference_vectors(reference_video_path, tier)
+    if len(reference_vectors) == 0:
+        return jsonify({'error': 'Could not analyze the reference video.'}), 400
 
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-    return feedback
+    try:
+        latency_budget_ms = positive_number(params.get('latency_budget_ms', LIVE_LATENCY_BUDGET_MS), 'latency_budget_ms')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # A warmed-up Pose instance from the live pool tracks the person for the whole session.
+        # The registry never opens more sessions than the pool has instances, so this doesn't wait.
+        session = live_sessions.create(partial(open_live_session, tier, side, reference_vectors, latency_budget_ms))
+    except TooManySessionsError as e:
+        return jsonify({'error': str(e)}), 429
+
+    return jsonify(dict(session.stats(), tier=tier)), 201
+
+# Function to build a live session on a Pose instance from the live pool.
+# The instance goes back to the pool if the session can't be built.
+def open_live_session(tier, side, reference_vectors, latency_budget_ms):
+    pose_instance = live_pose_pool.checkout(tier)
+    try:
+        return LiveSession(pose_instance, partial(calculate_hand_vector, side=side), compare_vectors,
+                           reference_vectors, latency_budget_ms=latency_budget_ms,
+                           release_pose=partial(live_pose_pool.checkin, tier))
+    except Exception:
+        live_pose_pool.checkin(tier, pose_instance)
+        raise
+
+# Route to send one JPEG frame of a live session, either as the raw request body
+# or as a 'frame' file. The optional X-Frame-Timestamp header (ms since epoch)
+# lets the server drop frames that arrive after their latency budget.
+@app.route('/live/sessions/<session_id>/frames', methods=['POST'])
+def live_session_frame(session_id):
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+
+    frame_bytes = request.files['frame'].read() if 'frame' in request.files else request.get_data()
+    if not frame_bytes:
+        return jsonify({'error': 'No frame uploaded'}), 400
+
+    timestamp = request.headers.get('X-Frame-Timestamp')
+    try:
+        timestamp = positive_number(timestamp, 'X-Frame-Timestamp') if timestamp else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = session.submit_frame(frame_bytes, timestamp)
+    if response['status'] == 'error':
+        return jsonify(response), 400
+    return jsonify(response)
+
+# Route to get the counters of a live session
+@app.route('/live/sessions/<session_id>', methods=['GET'])
+def live_session_stats(session_id):
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    return jsonify(session.stats())
+
+# Route to close a live session
+@app.route('/live/sessions/<session_id>', methods=['DELETE'])
+def close_live_session(session_id):
+    session = live_sessions.close(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    return jsonify(session.stats())
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+# Benchmarks for the pose -> features -> compare -> score hot path.
+# Everything runs on synthetic landmark sequences and a generated test video,
+# so no network, GPU or dataset is needed:
+#   python benchmark.py --output results.json
+#   python benchmark.py --compare results.json
+#   python benchmark.py --only features --only compare
+
+DEFAULT_FRAMES = 300
+DEFAULT_VIDEO_SIZE = (640, 480)
+DEFAULT_VIDEO_FPS = 30
+
+# Function to build a (frames, 33, 4) keypoint sequence of someone doing curls with the left arm
+def synthetic_keypoints(frames=DEFAULT_FRAMES, reps=5, seed=0):
+    rng = np.random.default_rng(seed)
+    keypoints = np.zeros((frames, 33, 4), dtype=np.float32)
+
+    # A still body, with a little noise on every landmark
+    keypoints[:, :, 0] = rng.uniform(0.35, 0.65, 33)
+    keypoints[:, :, 1] = rng.uniform(0.1, 0.9, 33)
+    keypoints[:, :, :3] += rng.normal(0, 0.002, (frames, 33, 3))
+    keypoints[:, :, 3] = 0.99
+
+    # The left forearm swings around the elbow between 170 and 40 degrees
+    phase = np.linspace(0, 2 * np.pi * reps, frames)
+    elbow_angle = np.radians(105 + 65 * np.cos(phase))
+    shoulder = np.array([0.55, 0.3], dtype=np.float32)
+    elbow = np.array([0.56, 0.45], dtype=np.float32)
+    keypoints[:, 11, :2] = shoulder
+    keypoints[:, 13, :2] = elbow
+    keypoints[:, 15, 0] = elbow[0] + 0.14 * np.sin(elbow_angle)
+    keypoints[:, 15, 1] = elbow[1] - 0.14 * np.cos(elbow_angle)
+    return keypoints
+
+# Function to write a short test video of a stick figure doing curls
+def write_test_video(path, frames=DEFAULT_FRAMES, size=DEFAULT_VIDEO_SIZE, fps=DEFAULT_VIDEO_FPS):
+    width, height = size
+    keypoints = synthetic_keypoints(frames)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    bones = [(11, 13), (13, 15), (11, 12), (11, 23), (12, 24), (23, 24)]
+
+    for frame_keypoints in keypoints:
+        frame = np.full((height, width, 3), 200, dtype=np.uint8)
+        points = (frame_keypoints[:, :2] * [width, height]).astype(int)
+        for a, b in bones:
+            cv2.line(frame, tuple(points[a]), tuple(points[b]), (60, 60, 60), 8)
+        cv2.circle(frame, tuple(points[0]), 25, (60, 60, 60), -1)
+        writer.write(frame)
+
+    writer.release()
+    return path
+
+# Function to run fn and measure its wall time and peak Python/NumPy memory.
+# The first run is traced with tracemalloc for the memory peak; when repeat > 1
+# the timing comes from the fastest of `repeat` further, untraced runs.
+def measure(fn, frames, repeat=1):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    best = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    if repeat > 1:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+
+    return {
+        'frames': frames,
+        'seconds': round(best, 6),
+        'fps': round(frames / best, 1) if best > 0 else None,
+        'peak_memory_mb': round(peak / 2 ** 20, 2),
+    }
+
+# Stage: decoding frames with OpenCV
+def bench_decode(video_path, frames, repeat):
+    def run():
+        video = cv2.VideoCapture(video_path)
+        while video.read()[0]:
+            pass
+        video.release()
+    return measure(run, frames, repeat)
+
+# Stage: pose.process on every frame (RGB conversion included)
+def bench_inference(video_path, frames, repeat):
+    from process_video import create_pose
+
+    video = cv2.VideoCapture(video_path)
+    images = []
+    ok, frame = video.read()
+    while ok:
+        images.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        ok, frame = video.read()
+    video.release()
+
+    pose_instance = create_pose()
+    try:
+        return measure(lambda: [pose_instance.process(image) for image in images], len(images), repeat)
+    finally:
+        pose_instance.close()
+
+# Stage: process_video end to end (decode, sampling, inference), without the cache
+def bench_process_video(video_path, frames, repeat):
+    from process_video import process_video
+    return measure(lambda: process_video(video_path, use_cache=False), frames, repeat)
+
+# Stage: calculate_hand_vector per frame, and the vectorized extract_hand_vectors
+def bench_hand_vectors(keypoints, repeat):
+    from types import SimpleNamespace
+    from comparison import calculate_hand_vector
+    from extract_features_from_videos import extract_hand_vectors
+
+    landmark_frames = [[SimpleNamespace(x=float(x), y=float(y)) for x, y in frame[:, :2]] for frame in keypoints]
+    return {
+        'calculate_hand_vector': measure(
+            lambda: [calculate_hand_vector(landmarks) for landmarks in landmark_frames], len(keypoints), repeat),
+        'extract_hand_vectors': measure(lambda: extract_hand_vectors(keypoints), len(keypoints), repeat),
+    }
+
+# Stage: per-video feature extraction
+def bench_features(keypoints, repeat):
+    from extract_features_from_videos import extract_multiple_features
+    videos = [keypoints] * 10
+    return measure(lambda: extract_multiple_features(videos), len(keypoints) * len(videos), repeat)
+
+# Stage: comparing a user sequence with a reference (DTW alignment, rep detection and feedback)
+def bench_compare(keypoints, repeat):
+    from comparison import analyze_vectors
+    from extract_features_from_videos import extract_hand_vectors
+
+    user = extract_hand_vectors(np.concatenate([keypoints] * 4))
+    reference = extract_hand_vectors(synthetic_keypoints(len(keypoints), reps=5, seed=1))
+    return measure(lambda: analyze_vectors(user, reference), len(user), repeat)
+
+# Stage: matching a user sequence against 200 references at once (bulk_comparison.py)
+def bench_bulk_compare(keypoints, repeat):
+    from bulk_comparison import ReferenceBank, rep_sequences
+
+    references = [rep_sequences(synthetic_keypoints(len(keypoints), reps=5, seed=seed), max_reps=1)[0]
+                  for seed in range(200)]
+    bank = ReferenceBank([f'reference_{i}' for i in range(len(references))], references)
+    user = np.concatenate([keypoints] * 4)
+    return measure(lambda: bank.compare(user), len(user), repeat)
+
+# Stage: generate_likeliness_video with a small model trained on synthetic features
+def bench_likeliness(video_path, frames, repeat):
+    from sklearn.ensemble import RandomForestClassifier
+    from generate_likeliness import generate_likeliness_video
+
+    rng = np.random.default_rng(0)
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(rng.uniform(0, 360, (40, 2)), np.arange(40) % 2)
+
+    output_path = os.path.join(os.path.dirname(video_path), 'likeliness.mp4')
+    return measure(lambda: generate_likeliness_video(model, video_path, output_path), frames, repeat)
+
+BENCHMARKS = ['decode', 'inference', 'process_video', 'hand_vectors', 'features', 'compare', 'bulk_compare', 'likeliness']
+
+def run_benchmarks(frames=DEFAULT_FRAMES, repeat=3, only=None):
+    selected = only or BENCHMARKS
+    keypoints = synthetic_keypoints(frames)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = write_test_video(os.path.join(tmp_dir, 'benchmark.mp4'), frames)
+
+        # Pose inference is slow, so the video benchmarks run once
+        if 'decode' in selected:
+            results['decode'] = bench_decode(video_path, frames, repeat)
+        if 'inference' in selected:
+            results['inference'] = bench_inference(video_path, frames, 1)
+        if 'process_video' in selected:
+            results['process_video'] = bench_process_video(video_path, frames, 1)
+        if 'hand_vectors' in selected:
+            results.update(bench_hand_vectors(keypoints, repeat))
+        if 'features' in selected:
+            results['features'] = bench_features(keypoints, repeat)
+        if 'compare' in selected:
+            results['compare'] = bench_compare(keypoints, repeat)
+        if 'bulk_compare' in selected:
+            results['bulk_compare'] = bench_bulk_compare(keypoints, repeat)
+        if 'likeliness' in selected:
+            results['likeliness'] = bench_likeliness(video_path, frames, 1)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+        },
+        'frames': frames,
+        'results': results,
+    }
+
+# Function to print the fps of each benchmark next to a baseline run
+def compare_results(current, baseline):
+    print(f"{'benchmark':<24}{'baseline fps':>14}{'current fps':>14}{'change':>10}")
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name, {}).get('fps')
+        new = result['fps']
+        change = f"{(new / old - 1) * 100:+.1f}%" if old and new else '-'
+        print(f"{name:<24}{old if old is not None else '-':>14}{new if new is not None else '-':>14}{change:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the pose -> features -> compare -> score path.')
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help='Length of the synthetic sequences')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark, the fastest is kept')
+    parser.add_argument('--only', action='append', choices=BENCHMARKS, help='Run only these benchmarks')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.frames, args.repeat, args.only)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(report, json.load(f))
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,112 @@
+import numpy as np
+from rep_segmentation import segment_reps, elbow_angle_series, rep_bounds
+
+# Scores one user sequence against every reference template at once. Every
+# sequence is normalized for camera position and body size, cut into reps and
+# resampled to a fixed length. The references are stacked into one array, so
+# each user rep is compared with all of them in one broadcast over
+# (references, time, joints) instead of one DTW per reference.
+
+# Joints compared, by landmark index
+JOINTS = {
+    'left_shoulder': 11, 'right_shoulder': 12,
+    'left_elbow': 13, 'right_elbow': 14,
+    'left_wrist': 15, 'right_wrist': 16,
+    'left_hip': 23, 'right_hip': 24,
+}
+JOINT_NAMES = list(JOINTS)
+JOINT_INDICES = list(JOINTS.values())
+
+LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP = 11, 12, 23, 24
+
+# Every rep is resampled to this many frames before comparing
+RESAMPLE_LENGTH = 64
+
+DEFAULT_TOP_K = 5
+
+# Function to normalize (frames, 33, 4) keypoints for camera position and body size.
+# Joints are centred on the mid-hip point of each frame and scaled by the median
+# torso length (mid-shoulder to mid-hip) of the sequence. Returns (frames, joints, 2).
+def normalize_keypoints(keypoints):
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    points = keypoints[..., :2]
+    mid_hip = (points[:, LEFT_HIP] + points[:, RIGHT_HIP]) / 2
+    mid_shoulder = (points[:, LEFT_SHOULDER] + points[:, RIGHT_SHOULDER]) / 2
+
+    torso = np.median(np.linalg.norm(mid_shoulder - mid_hip, axis=1)) if len(points) else 0
+    if not torso > 0:
+        torso = 1.0
+    return (points[:, JOINT_INDICES] - mid_hip[:, None]) / torso
+
+# Function to linearly resample a sequence to `length` frames along its first axis
+def resample(sequence, length=RESAMPLE_LENGTH):
+    positions = np.linspace(0, len(sequence) - 1, length)
+    low = np.floor(positions).astype(int)
+    high = np.minimum(low + 1, len(sequence) - 1)
+    weight = (positions - low).reshape(-1, *([1] * (sequence.ndim - 1)))
+    return sequence[low] * (1 - weight) + sequence[high] * weight
+
+# Function to turn keypoints into an array of resampled reps, shape (reps, length, joints, 2).
+# Frames without a pose (NaN) are dropped. When no rep is found the whole sequence counts as one.
+def rep_sequences(keypoints, side='left', length=RESAMPLE_LENGTH, max_reps=None):
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    keypoints = keypoints[~np.isnan(keypoints[:, :, :2]).any(axis=(1, 2))]
+    if len(keypoints) < 2:
+        return np.empty((0, length, len(JOINTS), 2), dtype=np.float32)
+
+    normalized = normalize_keypoints(keypoints)
+    bounds = rep_bounds(segment_reps(elbow_angle_series(keypoints, side)))
+    bounds = bounds[:max_reps] or [(0, len(keypoints))]
+    return np.stack([resample(normalized[start:end], length) for start, end in bounds]).astype(np.float32)
+
+# Stack of reference reps (the first rep of every template), compared in one go
+class ReferenceBank:
+    def __init__(self, names, sequences, metadata=None):
+        self.names = list(names)
+        self.sequences = np.asarray(sequences, dtype=np.float32).reshape(-1, RESAMPLE_LENGTH, len(JOINTS), 2)
+        self.metadata = list(metadata) if metadata is not None else [{} for _ in self.names]
+
+    # Function to build the bank from a ReferenceLibrary; templates without a usable pose are skipped
+    @classmethod
+    def from_library(cls, library):
+        names, sequences, metadata = [], [], []
+        for template_metadata in library.templates():
+            template = library.get(template_metadata['template_id'])
+            reps = rep_sequences(template.keypoints, template.side, max_reps=1)
+            if len(reps):
+                names.append(template.template_id)
+                sequences.append(reps[0])
+                metadata.append(template.metadata)
+        return cls(names, sequences, metadata)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Function to score a user's (frames, 33, 4) keypoints against every reference.
+    # The distance of a reference is the mean over user reps, frames and joints of
+    # the normalized joint distance. Returns the top_k closest, nearest first,
+    # with the deviation of every joint.
+    def compare(self, keypoints, top_k=DEFAULT_TOP_K, side='left'):
+        user = rep_sequences(keypoints, side)
+        if len(user) == 0 or len(self) == 0:
+            return []
+
+        # One user rep at a time, so memory is bounded by the size of the library, not the session:
+        # (references, frames, joints) -> (references, joints), averaged over the reps
+        joint_deviations = np.zeros(self.sequences.shape[:1] + self.sequences.shape[2:3], dtype=np.float64)
+        for user_rep in user:
+            joint_deviations += np.linalg.norm(self.sequences - user_rep, axis=-1).mean(axis=1)
+        joint_deviations /= len(user)
+        scores = joint_deviations.mean(axis=1)
+
+        top_k = min(top_k, len(scores))
+        nearest = np.argpartition(scores, top_k - 1)[:top_k]
+        nearest = nearest[np.argsort(scores[nearest])]
+
+        return [{
+            'template_id': self.names[i],
+            'exercise_id': self.metadata[i].get('exercise_id'),
+            'source': self.metadata[i].get('source'),
+            'distance': round(float(scores[i]), 4),
+            'joint_deviations': dict(zip(JOINT_NAMES, np.round(joint_deviations[i].astype(np.float64), 4).tolist())),
+        } for i in nearest]
@@ -0,0 +1,214 @@
+import json
+import os
+import uuid
+import zipfile
+import cv2
+import numpy as np
+import keypoint_cache
+from frame_sampler import AdaptiveSampler
+from roi_cropper import PoseCropper
+from quality_tiers import DEFAULT_TIER, tier_settings
+from process_video import cache_settings, landmarks_to_array, NUM_LANDMARKS, LANDMARK_FIELDS
+from extract_features_from_videos import extract_hand_vectors
+from job_queue import JobCancelled
+from video_pipeline import FrameReader
+from metrics import stage_seconds, frames_total, queue_depth
+
+# Long videos are processed in fixed-length time windows. The landmarks of
+# every finished window are checkpointed to disk, keyed by the video's content
+# hash and the processing settings, so an interrupted run picks up at the first
+# window without a checkpoint. Windows are yielded one at a time and nothing
+# is kept between them, so memory use doesn't grow with the video's length.
+
+# Length of one window in seconds of video
+CHUNK_SECONDS = 30
+
+# Shortest window allowed, so a run never writes a checkpoint for every few frames
+MIN_CHUNK_SECONDS = 1
+
+# Folder holding one sub-folder of window checkpoints per (video content, settings) pair
+CHECKPOINT_DIR = os.environ.get('PROFORMAI_CHECKPOINT_DIR', os.path.join(keypoint_cache.CACHE_DIR, 'chunks'))
+
+# Function to find the checkpoint folder of a video
+def checkpoint_folder(file_path, chunk_seconds=CHUNK_SECONDS, tier=DEFAULT_TIER, checkpoint_dir=None):
+    settings = dict(cache_settings(tier), chunk_seconds=chunk_seconds)
+    return os.path.join(checkpoint_dir or CHECKPOINT_DIR, keypoint_cache.cache_key(file_path, settings))
+
+def _window_path(folder, index):
+    return os.path.join(folder, f'window_{index:05d}.npz')
+
+# Function to load a window checkpoint, returns None if it is missing or unreadable
+def load_window(folder, index):
+    path = _window_path(folder, index)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            window = {name: data[name] for name in data.files}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        # Truncated or corrupt checkpoint, delete it and process the window again
+        _remove_quietly(path)
+        return None
+    window['info'] = json.loads(str(window['info']))
+    return window
+
+# Function to delete a file that may already be gone
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Function to store a window checkpoint, written to a temporary file first so
+# a crash never leaves a partial checkpoint behind. The temporary name is unique
+# per call, so threads and processes writing the same window don't collide.
+def save_window(folder, index, frame_numbers, landmarks, info):
+    os.makedirs(folder, exist_ok=True)
+    path = _window_path(folder, index)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, frame_numbers=np.asarray(frame_numbers, dtype=np.int64),
+                 landmarks=np.asarray(landmarks, dtype=np.float32).reshape(-1, NUM_LANDMARKS, LANDMARK_FIELDS),
+                 info=np.array(json.dumps(info)))
+    os.replace(tmp_path, path)
+
+# Frames of a video in order, decoded ahead on a FrameReader thread (see
+# video_pipeline.py). A window stops at the first frame past its end, which is
+# kept for the next window, so windows run back to back without seeking.
+class _FrameSource:
+    def __init__(self, video):
+        self._video = video
+        self._reader = None
+        self._frames = iter(())
+        self._pending = None
+        self.next_frame = None  # Number of the frame decoding continues at, None before seek()
+
+    # Function to restart decoding at first_frame
+    def seek(self, first_frame):
+        self.stop()
+        self._video.set(cv2.CAP_PROP_POS_FRAMES, first_frame - 1)
+        self._reader = FrameReader(self._video, first_frame=first_frame).start()
+        self._frames = iter(self._reader)
+        self._pending = None
+        self.next_frame = first_frame
+
+    # Function to iterate over the (frame_number, frame) pairs up to last_frame.
+    # Sets self.reached_end when the video ended before last_frame.
+    def window(self, last_frame):
+        self.reached_end = False
+        while True:
+            item = self._pending or next(self._frames, None)
+            self._pending = None
+            if item is None:
+                self.reached_end = True
+                return
+            if item[0] > last_frame:
+                self._pending = item
+                self.next_frame = item[0]
+                return
+            self.next_frame = item[0] + 1
+            yield item
+
+    def queue_depth(self):
+        return self._reader.queue_depth() if self._reader is not None else 0
+
+    def stop(self):
+        if self._reader is not None:
+            self._reader.stop()
+            self._reader = None
+
+# Function to process the frames of one window, from source's current position
+# to last_frame. Returns (frame_numbers, landmarks, number of the last frame read, reached_end).
+def _process_window(source, pose_instance, first_frame, last_frame, fps, tier, cancel_event=None):
+    # Sampling and cropping restart in every window, the same as after a resume.
+    # (MediaPipe's own tracking still carries over when windows run back to back.)
+    settings = tier_settings(tier)
+    sampler = AdaptiveSampler(fps, settings['target_hz'])
+    cropper = PoseCropper(settings['inference_width'])
+    no_pose = np.full((NUM_LANDMARKS, LANDMARK_FIELDS), np.nan, dtype=np.float32)
+    frame_numbers = []
+    landmarks = []
+
+    for frame_number, frame in source.window(last_frame):
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled()
+
+        queue_depth.set(source.queue_depth(), 'decode')
+        if not sampler.should_sample(frame_number):
+            frames_total.inc('skipped')
+            continue
+
+        with stage_seconds.time('preprocess'):
+            image_rgb = cropper.prepare(frame)
+        with stage_seconds.time('pose_process'):
+            results = cropper.finish(pose_instance.process(image_rgb))
+        frames_total.inc('sampled' if results.pose_landmarks else 'no_pose')
+
+        frame_numbers.append(frame_number)
+        if results.pose_landmarks:
+            keypoints = landmarks_to_array(results.pose_landmarks)
+            landmarks.append(keypoints)
+            sampler.update(frame_number, keypoints)
+        else:
+            landmarks.append(no_pose)
+            sampler.update(frame_number, None)
+
+    return frame_numbers, landmarks, source.next_frame - 1, source.reached_end
+
+# Generator that processes a video window by window, resuming from checkpoints.
+# Yields one dict per window with its time range, the analysed frame numbers
+# (1-based), their (n, 33, 4) landmarks (NaN where no pose was found), the
+# left-arm hand vectors of the frames with a pose, and whether the window came
+# from a checkpoint. pose_instance must match the quality tier.
+def process_in_chunks(file_path, pose_instance, chunk_seconds=CHUNK_SECONDS, tier=DEFAULT_TIER,
+                      checkpoint_dir=None, cancel_event=None):
+    folder = checkpoint_folder(file_path, chunk_seconds, tier, checkpoint_dir)
+    video = cv2.VideoCapture(file_path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video file: {file_path}")
+
+    fps = video.get(cv2.CAP_PROP_FPS) or 30
+    window_frames = max(1, round(chunk_seconds * fps))
+    source = _FrameSource(video)
+
+    try:
+        index = 0
+        while True:
+            first_frame = index * window_frames + 1
+            last_frame = first_frame + window_frames - 1
+
+            window = load_window(folder, index)
+            resumed = window is not None
+            if not resumed:
+                # Start decoding here, unless the previous window was just decoded up to this frame
+                if source.next_frame != first_frame:
+                    source.seek(first_frame)
+                frame_numbers, landmarks, last_read, reached_end = _process_window(
+                    source, pose_instance, first_frame, last_frame, fps, tier, cancel_event)
+                info = {'fps': fps, 'first_frame': first_frame, 'last_frame': last_read, 'last': reached_end}
+                save_window(folder, index, frame_numbers, landmarks, info)
+                window = {'frame_numbers': np.asarray(frame_numbers, dtype=np.int64),
+                          'landmarks': np.asarray(landmarks, dtype=np.float32).reshape(-1, NUM_LANDMARKS, LANDMARK_FIELDS),
+                          'info': info}
+
+            info = window['info']
+            # A video that ends exactly on a window boundary leaves an empty last window
+            if info['last_frame'] >= info['first_frame'] or index == 0:
+                landmarks = window['landmarks']
+                with_pose = ~np.isnan(landmarks[:, 0, 0])
+                yield {
+                    'window': index,
+                    'start_time': (info['first_frame'] - 1) / fps,
+                    'end_time': info['last_frame'] / fps,
+                    'frame_numbers': window['frame_numbers'],
+                    'landmarks': landmarks,
+                    'vectors': extract_hand_vectors(landmarks[with_pose]),
+                    'resumed': resumed,
+                }
+
+            if info['last']:
+                break
+            index += 1
+    finally:
+        source.stop()
+        video.release()
@@ -0,0 +1,214 @@
+import logging
+import math
+import numpy as np
+from extract_features_from_videos import ARM_LANDMARKS
+from rep_segmentation import segment_reps, elbow_angles_from_vectors, rep_bounds as reps_to_bounds
+from metrics import stage_seconds
+
+# Sakoe-Chiba band half-width, as a fraction of the reference length.
+# The band never gets narrower than DTW_MIN_BAND reference frames.
+DTW_BAND_FRACTION = 0.1
+DTW_MIN_BAND = 10
+
+# A rep whose average deviation is certainly above this is not aligned to the end,
+# it is reported with this deviation and marked as abandoned
+DTW_ABANDON_DEVIATION = 0.5
+
+# Function to compute the distance between user frames and reference frames.
+# Both have shape (..., parts, dims), e.g. (..., 2, 2) for upper/lower arm vectors;
+# the distance is the mean over the parts of the L2 norm of their difference,
+# the same measure compare_vectors used per frame.
+def frame_distances(user, reference):
+    return np.linalg.norm(user - reference, axis=-1).mean(axis=-1)
+
+# Function to build the banded cost matrix in one vectorized pass.
+# Row i covers reference frames [lo[i], hi[i]) around the scaled diagonal;
+# returns (costs, lo, hi) where costs has shape (n, band width) and is inf outside the band.
+def banded_costs(user, reference, band):
+    n, m = len(user), len(reference)
+    centers = np.rint(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(np.int64)
+    lo = np.maximum(centers - band, 0)
+    hi = np.minimum(centers + band + 1, m)
+
+    width = int((hi - lo).max())
+    columns = lo[:, np.newaxis] + np.arange(width)
+    valid = columns < hi[:, np.newaxis]
+    columns = np.minimum(columns, m - 1)
+
+    costs = frame_distances(user[:, np.newaxis], reference[columns]).astype(np.float64)
+    costs[~valid] = np.inf
+    return costs, lo, hi
+
+# Function to align a user sequence with a reference sequence using dynamic time warping.
+# Work is O(n * band). With abandon_above set, returns None as soon as every cell
+# of a row costs more than that (the final distance can only be larger).
+def dtw_align(user_vectors, reference_vectors, band=None, abandon_above=None):
+    user = np.asarray(user_vectors, dtype=np.float32)
+    reference = np.asarray(reference_vectors, dtype=np.float32)
+    n, m = len(user), len(reference)
+    if n == 0 or m == 0:
+        raise ValueError('Cannot align an empty sequence.')
+
+    if band is None:
+        band = max(DTW_MIN_BAND, int(math.ceil(DTW_BAND_FRACTION * m)))
+    # The band has to be at least as wide as the slope, or the rows would not connect
+    band = max(band, int(math.ceil(m / n)))
+
+    costs, lo, hi = banded_costs(user, reference, band)
+
+    # Accumulated cost, one banded row per user frame.
+    # Each row follows D[i, j] = c[i, j] + min(D[i-1, j-1], D[i-1, j], D[i, j-1]).
+    # With a[j] = min(D[i-1, j-1], D[i-1, j]) and S the running sum of c[i] along
+    # the row, this is D[i, j] = S[j] + min over k <= j of (a[k] - S[k-1]),
+    # which is a cumulative minimum, so each row is computed without a Python loop.
+    rows = []
+    previous = None
+    for i in range(n):
+        row_costs = costs[i, :hi[i] - lo[i]]
+        running = np.cumsum(row_costs)
+
+        if previous is None:
+            # The path starts at (0, 0), so only cells reachable along the first row count
+            row = running if lo[i] == 0 else np.full(len(row_costs), np.inf)
+        else:
+            prev_row, prev_lo = previous
+            # Previous row values for columns lo-1 .. hi-1, inf outside its band
+            padded = np.full(hi[i] - lo[i] + 1, np.inf)
+            start = max(prev_lo, lo[i] - 1)
+            stop = min(prev_lo + len(prev_row), hi[i])
+            if stop > start:
+                padded[start - lo[i] + 1:stop - lo[i] + 1] = prev_row[start - prev_lo:stop - prev_lo]
+            best_previous = np.minimum(padded[:-1], padded[1:])
+            row = running + np.minimum.accumulate(best_previous - (running - row_costs))
+
+        if abandon_above is not None and row.min() > abandon_above:
+            return None
+
+        rows.append(row)
+        previous = (row, lo[i])
+
+    distance = rows[-1][m - 1 - lo[-1]]
+
+    # Walk back from the last cell to recover the warping path
+    path = [(n - 1, m - 1)]
+    i, j = n - 1, m - 1
+    while i > 0 or j > 0:
+        candidates = []
+        if i > 0 and j > 0 and lo[i - 1] <= j - 1 < hi[i - 1]:
+            candidates.append((rows[i - 1][j - 1 - lo[i - 1]], i - 1, j - 1))
+        if i > 0 and lo[i - 1] <= j < hi[i - 1]:
+            candidates.append((rows[i - 1][j - lo[i - 1]], i - 1, j))
+        if j > lo[i]:
+            candidates.append((rows[i][j - 1 - lo[i]], i, j - 1))
+        _, i, j = min(candidates)
+        path.append((i, j))
+    path = np.array(path[::-1], dtype=np.int64)
+
+    # Per user frame: mean cost of the path cells on that frame, and the matched reference frame
+    path_costs = costs[path[:, 0], path[:, 1] - lo[path[:, 0]]]
+    counts = np.bincount(path[:, 0], minlength=n)
+    frame_deviations = np.bincount(path[:, 0], weights=path_costs, minlength=n) / counts
+    matched_reference = np.bincount(path[:, 0], weights=path[:, 1], minlength=n) / counts
+
+    return {
+        'distance': float(distance),
+        'average_deviation': float(path_costs.mean()),
+        'path': path,
+        'frame_deviations': frame_deviations,
+        'matched_reference': matched_reference,
+    }
+
+# Function to average the per-frame deviations over each repetition.
+# rep_bounds is a list of (start, end) user frame ranges; None treats the clip as one rep.
+def rep_deviations(frame_deviations, rep_bounds=None):
+    if rep_bounds is None:
+        rep_bounds = [(0, len(frame_deviations))]
+    return [float(np.mean(frame_deviations[start:end])) for start, end in rep_bounds if end > start]
+
+# Function to calculate the vector representing hand movement of the left or right arm
+def calculate_hand_vector(landmarks, side='left'):
+    def create_vector(a, b):
+        return np.array([b[0] - a[0], b[1] - a[1]])
+
+    try:
+        # Get coordinates for shoulder, elbow, and wrist
+        shoulder_index, elbow_index, wrist_index = ARM_LANDMARKS[side]
+        shoulder = [landmarks[shoulder_index].x, landmarks[shoulder_index].y]
+        elbow = [landmarks[elbow_index].x, landmarks[elbow_index].y]
+        wrist = [landmarks[wrist_index].x, landmarks[wrist_index].y]
+
+        # Create vectors representing arm movement
+        upper_arm_vector = create_vector(shoulder, elbow)
+        lower_arm_vector = create_vector(elbow, wrist)
+
+        # Return the vectors for further comparison
+        return (upper_arm_vector, lower_arm_vector)
+
+    except IndexError as e:
+        logging.error(f"Error calculating hand vector: {str(e)}")
+        return None
+
+# Function to cut a reference down to its first rep, so a user rep is compared with one reference rep
+def reference_rep(reference_vectors):
+    reps = segment_reps(elbow_angles_from_vectors(reference_vectors))
+    if not reps:
+        return reference_vectors
+    return reference_vectors[reps[0]['start']:reps[0]['end'] + 1]
+
+# Function to align every user rep with one reference rep (dynamic time warping)
+# and report how far off they are per frame and per repetition.
+# Reps are detected from the user's elbow angle unless rep_bounds is given, and
+# timed by timestamps (seconds per user vector) when given. Without reps the whole
+# clip is aligned as one. Frames outside every rep have no deviation (None).
+def analyze_vectors(user_vectors, reference_vectors, rep_bounds=None, timestamps=None,
+                    abandon_deviation=DTW_ABANDON_DEVIATION):
+    if len(user_vectors) == 0 or len(reference_vectors) == 0:
+        return {'feedback': feedback_for_deviation(0), 'average_deviation': 0,
+                'frame_deviations': [], 'rep_deviations': [], 'reps': []}
+
+    reps = []
+    if rep_bounds is None:
+        reps = segment_reps(elbow_angles_from_vectors(user_vectors), timestamps=timestamps)
+        rep_bounds = reps_to_bounds(reps)
+    rep_bounds = [(start, end) for start, end in rep_bounds if end > start] or [(0, len(user_vectors))]
+
+    user_vectors = np.asarray(user_vectors, dtype=np.float32)
+    reference = np.asarray(reference_rep(reference_vectors), dtype=np.float32)
+    frame_deviations = np.full(len(user_vectors), np.nan)
+    deviations, abandoned = [], []
+    with stage_seconds.time('compare'):
+        for start, end in rep_bounds:
+            # A path has at most n + m - 1 cells, so a larger distance means a larger average
+            alignment = dtw_align(user_vectors[start:end], reference,
+                                  abandon_above=abandon_deviation * (end - start + len(reference) - 1))
+            if alignment is None:
+                deviations.append(abandon_deviation)
+                abandoned.append(True)
+            else:
+                frame_deviations[start:end] = alignment['frame_deviations']
+                deviations.append(alignment['average_deviation'])
+                abandoned.append(False)
+
+    for rep, deviation, gave_up in zip(reps, deviations, abandoned):
+        rep['deviation'] = deviation
+        rep['abandoned'] = gave_up
+    avg_vector_diff = float(np.mean(deviations))
+
+    return {
+        'feedback': feedback_for_deviation(avg_vector_diff),
+        'average_deviation': avg_vector_diff,
+        'frame_deviations': [None if np.isnan(value) else value for value in np.round(frame_deviations, 4).tolist()],
+        'rep_deviations': deviations,
+        'reps': reps,
+    }
+
+# Function to turn an average vector difference into feedback for the user
+def feedback_for_deviation(avg_vector_diff):
+    if avg_vector_diff > 0.1:  # Tweak the threshold as needed for sensitivity
+        return f"Your hand movement is off by an average of {avg_vector_diff:.2f}. Try to match the professional's form."
+    else:
+        return "Your hand movement looks good!"
+
+# Compare user's hand vectors with reference hand vectors
+def compare_vectors(user_vectors, reference_vectors):
+    return analyze_vectors(user_vectors, reference_vectors)['feedback']
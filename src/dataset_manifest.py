@@ -0,0 +1,149 @@
+import argparse
+import json
+import logging
+import os
+import time
+import cv2
+import keypoint_cache
+
+# Dataset manifest: one JSON index of the unique videos in the training corpus.
+# The corpus folders hold copies of the same clips (e.g. 'Bicep Curls cor - Copy',
+# with a nested copy of 'Bicep Curls cor'), so videos are identified by the
+# SHA-256 of their content and every copy collapses into one entry:
+#   python dataset_manifest.py --output pipeline_output/manifest.json
+#   python pipeline.py all --manifest pipeline_output/manifest.json
+
+MANIFEST_VERSION = 1
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+
+# Labels by folder name. A video gets the label of the innermost folder on its
+# path that is listed here, after removing ' - Copy' suffixes from the name.
+DEFAULT_LABELS = {
+    'Bicep Curls cor': 'correct',
+    'Bicep Curls incor': 'incorrect',
+}
+
+# Folders that never hold training videos
+SKIP_DIRS = {'uploads', 'outputs', 'references', 'pipeline_output', 'testing', '__pycache__', 'node_modules'}
+
+# Function to find the label of a video from the folders on its path, None if it has none
+def label_for_path(relative_path, labels=DEFAULT_LABELS):
+    folders = os.path.normpath(relative_path).split(os.sep)[:-1]
+    for folder in reversed(folders):
+        name = folder
+        while name.endswith(' - Copy'):
+            name = name[:-len(' - Copy')]
+        if name in labels:
+            return labels[name]
+    return None
+
+# Function to read the frame count, fps and duration of a video from its header
+def video_info(file_path):
+    video = cv2.VideoCapture(file_path)
+    try:
+        if not video.isOpened():
+            return None
+        fps = video.get(cv2.CAP_PROP_FPS)
+        frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {'frames': frames, 'fps': fps, 'duration': round(frames / fps, 3) if fps else None}
+    finally:
+        video.release()
+
+# Function to list the video files under root, in a stable order
+def find_videos(root):
+    for folder, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith('.') and name not in SKIP_DIRS)
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(VIDEO_EXTENSIONS):
+                yield os.path.join(folder, file_name)
+
+# Function to walk the corpus and build the manifest. Every unique video is
+# kept once, under its shortest path; the other copies are listed as duplicates.
+# Videos whose copies carry different labels are left out and reported as conflicts.
+def build_manifest(root=SRC_DIR, labels=DEFAULT_LABELS):
+    entries = {}
+    unlabelled = 0
+
+    for file_path in find_videos(root):
+        relative_path = os.path.relpath(file_path, root)
+        label = label_for_path(relative_path, labels)
+        if label is None:
+            unlabelled += 1
+            continue
+
+        content_hash = keypoint_cache.file_hash(file_path)
+        entry = entries.get(content_hash)
+        if entry is None:
+            entries[content_hash] = {'hash': content_hash, 'paths': [relative_path], 'labels': {label},
+                                     'size': os.path.getsize(file_path)}
+        else:
+            entry['paths'].append(relative_path)
+            entry['labels'].add(label)
+
+    videos = []
+    conflicts = []
+    for entry in entries.values():
+        paths = sorted(entry['paths'], key=lambda path: (len(path), path))
+        if len(entry['labels']) > 1:
+            logging.warning(f"{paths[0]} has copies with different labels: {sorted(entry['labels'])}")
+            conflicts.append({'hash': entry['hash'], 'paths': paths, 'labels': sorted(entry['labels'])})
+            continue
+
+        info = video_info(os.path.join(root, paths[0]))
+        if info is None:
+            logging.warning(f"Could not open {paths[0]}, leaving it out of the manifest")
+            continue
+
+        videos.append(dict({'hash': entry['hash'], 'path': paths[0], 'label': entry['labels'].pop(),
+                            'size': entry['size']}, **info, duplicates=paths[1:]))
+
+    videos.sort(key=lambda video: (video['label'], video['path']))
+    return {
+        'version': MANIFEST_VERSION,
+        'root': os.path.abspath(root),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'files_seen': sum(len(entry['paths']) for entry in entries.values()) + unlabelled,
+        'unlabelled': unlabelled,
+        'videos': videos,
+        'conflicts': conflicts,
+    }
+
+def save_manifest(manifest, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"{path} has manifest version {manifest.get('version')}, expected {MANIFEST_VERSION}")
+    return manifest
+
+# Function to get the absolute paths of the unique videos with a label
+def manifest_paths(manifest, label):
+    return [os.path.join(manifest['root'], video['path']) for video in manifest['videos'] if video['label'] == label]
+
+# Function to print how many files, unique videos and duplicates were found
+def print_summary(manifest):
+    duplicates = sum(len(video['duplicates']) for video in manifest['videos'])
+    print(f"{manifest['files_seen']} video files, {len(manifest['videos'])} unique "
+          f"({duplicates} duplicates, {manifest['unlabelled']} unlabelled, {len(manifest['conflicts'])} conflicts)")
+    for label in sorted({video['label'] for video in manifest['videos']}):
+        videos = [video for video in manifest['videos'] if video['label'] == label]
+        print(f"  {label}: {len(videos)} videos, {sum(video['duration'] or 0 for video in videos):.1f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the deduplicated training corpus manifest.')
+    parser.add_argument('--root', default=SRC_DIR, help='Folder to search for labelled videos')
+    parser.add_argument('--output', default=os.path.join(SRC_DIR, 'pipeline_output', 'manifest.json'),
+                        help='Where to write the manifest')
+    args = parser.parse_args()
+
+    manifest = build_manifest(args.root)
+    save_manifest(manifest, args.output)
+    print_summary(manifest)
+    print(f"Saved manifest to {args.output}")
@@ -1,9 +1,20 @@
 import math
-import mediapipe as mp
 import numpy as np
-from process_video import process_videos_in_folder
 
-mp_pose = mp.solutions.pose
+# Landmark indices used by the features (values of mp.solutions.pose.PoseLandmark,
+# spelled out so this module does not have to import mediapipe)
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_ELBOW = 13
+RIGHT_ELBOW = 14
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+
+# Shoulder, elbow and wrist indices for each side of the body
+ARM_LANDMARKS = {
+    'left': (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST),
+    'right': (RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST),
+}
 
 # Function to calculate the angle between three points
 def calculate_angle(a, b, c):
@@ -12,38 +23,51 @@ def calculate_angle(a, b, c):
                          math.atan2(a[1] - b[1], a[0] - b[0]))
     return abs(angle)
 
+# Vectorized calculate_angle: a, b, c are arrays of points with shape (..., 2)
+def calculate_angles(a, b, c):
+    angles = np.degrees(np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0]) -
+                        np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0]))
+    return np.abs(angles)
+
+# Function to compute the per-frame joint angles of one video in a single pass.
+# keypoints has shape (frames, 33, 2+); returns (frames, 2) with elbow and shoulder angles.
+def extract_frame_features(keypoints):
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if keypoints.ndim != 3 or len(keypoints) == 0 or keypoints.shape[1] <= LEFT_WRIST:
+        return np.empty((0, 2), dtype=np.float32)
+
+    shoulder = keypoints[:, LEFT_SHOULDER, :2]
+    elbow = keypoints[:, LEFT_ELBOW, :2]
+    wrist = keypoints[:, LEFT_WRIST, :2]
+
+    # Calculate angles
+    elbow_angle = calculate_angles(shoulder, elbow, wrist)
+    shoulder_angle = calculate_angles(np.zeros_like(shoulder), shoulder, elbow)  # Add other angles
+
+    return np.stack([elbow_angle, shoulder_angle], axis=1)
+
+# Function to compute the upper and lower arm vectors of every frame, the same
+# vectors comparison.calculate_hand_vector builds. Returns shape (frames, 2, 2).
+def extract_hand_vectors(keypoints, side='left'):
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if keypoints.ndim != 3 or len(keypoints) == 0:
+        return np.empty((0, 2, 2), dtype=np.float32)
+
+    shoulder_index, elbow_index, wrist_index = ARM_LANDMARKS[side]
+    shoulder = keypoints[:, shoulder_index, :2]
+    elbow = keypoints[:, elbow_index, :2]
+    wrist = keypoints[:, wrist_index, :2]
+
+    return np.stack([elbow - shoulder, wrist - elbow], axis=1)
+
 # Extract multiple features (e.g., elbow, shoulder, wrist angles) from keypoints
 def extract_multiple_features(keypoints):
     features = []
     for video in keypoints:  # Loop through all videos
-        video_features = []
-        for frame in video:  # Loop through all frames in each video
-            # Extract multiple joint angles (shoulder, elbow, wrist, etc.)
-            try:
-                shoulder = frame[mp_pose.PoseLandmark.LEFT_SHOULDER.value][:2]
-                elbow = frame[mp_pose.PoseLandmark.LEFT_ELBOW.value][:2]
-                wrist = frame[mp_pose.PoseLandmark.LEFT_WRIST.value][:2]
-
-                # Calculate angles
-                elbow_angle = calculate_angle(shoulder, elbow, wrist)
-                shoulder_angle = calculate_angle([0, 0], shoulder, elbow)  # Add other angles
-
-                # Add both angles to the features for this frame
-                video_features.append([elbow_angle, shoulder_angle])
-            except IndexError:
-                continue
-
-        if video_features:
+        video_features = extract_frame_features(video)
+
+        if len(video_features):
             # Use the mean of features across all frames
-            features.append(np.mean(video_features, axis=0))
+            features.append(video_features.mean(axis=0))
     
     return np.array(features)
-
-# Example usage:
-if __name__ == "__main__":
-    correct_keypoints = process_videos_in_folder('D:\\ProFormAI\\ProFormAI\\src\\Bicep Curls cor')
-    incorrect_keypoints = process_videos_in_folder('D:\\ProFormAI\\ProFormAI\\src\\Bicep Curls incor')
-
-    # Extract features for correct and incorrect forms
-    correct_features = extract_multiple_features(correct_keypoints)
-    incorrect_features = extract_multiple_features(incorrect_keypoints)
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import numpy as np
+from extract_features_from_videos import extract_frame_features
+
+# On-disk feature store for training. The landmarks and the per-frame features
+# of every video are appended to two flat float32 files, and index.json records
+# where each video starts and how many frames it has. Readers memory-map the
+# files, so any video or frame range can be read without loading the corpus:
+#   store = FeatureStore(path)
+#   store.features(0)              # (frames, 2) elbow and shoulder angles of video 0
+#   store.landmarks(0)[100:200]    # (100, 33, 4) landmarks, read from disk on access
+
+STORE_VERSION = 1
+
+LANDMARKS_FILE = 'landmarks.f32'
+FEATURES_FILE = 'features.f32'
+INDEX_FILE = 'index.json'
+
+LANDMARK_SHAPE = (33, 4)
+FEATURE_NAMES = ['elbow_angle', 'shoulder_angle']
+
+# Writes a feature store one video at a time. The store is built in a temporary
+# folder and only replaces the previous one when close() is called.
+class FeatureStoreWriter:
+    # tier is the quality tier the keypoints were extracted at, recorded in the index
+    def __init__(self, path, tier=None):
+        self.path = path
+        self.tier = tier
+        self._tmp_path = path + '.tmp'
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+        os.makedirs(self._tmp_path)
+
+        self._landmarks_file = open(os.path.join(self._tmp_path, LANDMARKS_FILE), 'wb')
+        self._features_file = open(os.path.join(self._tmp_path, FEATURES_FILE), 'wb')
+        self._videos = []
+        self._frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # Function to append the (frames, 33, 4) keypoints of one video and their features
+    def add(self, video_path, label, keypoints, content_hash=None):
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, *LANDMARK_SHAPE)
+        features = np.asarray(extract_frame_features(keypoints), dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+
+        self._landmarks_file.write(keypoints.tobytes())
+        self._features_file.write(features.tobytes())
+        self._videos.append({'path': video_path, 'label': label, 'hash': content_hash,
+                             'offset': self._frames, 'frames': len(keypoints)})
+        self._frames += len(keypoints)
+
+    # Function to finish writing and swap the new store in place of the old one
+    def close(self):
+        self._landmarks_file.close()
+        self._features_file.close()
+        index = {
+            'version': STORE_VERSION,
+            'tier': self.tier,
+            'frames': self._frames,
+            'landmark_shape': list(LANDMARK_SHAPE),
+            'feature_names': FEATURE_NAMES,
+            'videos': self._videos,
+        }
+        with open(os.path.join(self._tmp_path, INDEX_FILE), 'w') as f:
+            json.dump(index, f, indent=2)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._landmarks_file.close()
+        self._features_file.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+# Read-only, memory-mapped view of a feature store
+class FeatureStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        if self.index.get('version') != STORE_VERSION:
+            raise ValueError(f"{path} has feature store version {self.index.get('version')}, expected {STORE_VERSION}")
+
+        self.videos = self.index['videos']
+        self.feature_names = self.index['feature_names']
+        frames = self.index['frames']
+        self._landmarks = self._memmap(LANDMARKS_FILE, (frames, *self.index['landmark_shape']))
+        self._features = self._memmap(FEATURES_FILE, (frames, len(self.feature_names)))
+
+    def _memmap(self, file_name, shape):
+        # np.memmap can't map an empty file
+        if shape[0] == 0:
+            return np.empty(shape, dtype=np.float32)
+        return np.memmap(os.path.join(self.path, file_name), dtype=np.float32, mode='r', shape=shape)
+
+    def __len__(self):
+        return len(self.videos)
+
+    def _range(self, index):
+        video = self.videos[index]
+        return slice(video['offset'], video['offset'] + video['frames'])
+
+    # Landmarks of one video, shape (frames, 33, 4)
+    def landmarks(self, index):
+        return self._landmarks[self._range(index)]
+
+    # Per-frame features of one video, shape (frames, len(feature_names))
+    def features(self, index):
+        return self._features[self._range(index)]
+
+    # Function to list the indices of the videos with a label (all videos when label is None)
+    def indices(self, label=None):
+        return [i for i, video in enumerate(self.videos) if label is None or video['label'] == label]
+
+    # Function to compute the mean features of every video with a label, one video at a time
+    def video_means(self, label=None):
+        means = [self.features(i).mean(axis=0) for i in self.indices(label) if self.videos[i]['frames']]
+        return np.array(means, dtype=np.float32).reshape(-1, len(self.feature_names))
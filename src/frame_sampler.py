@@ -0,0 +1,102 @@
+import math
+import numpy as np
+from roi_cropper import ROI_MIN_VISIBILITY
+
+# Effective pose rate we aim for, independent of the source fps
+DEFAULT_TARGET_HZ = 15.0
+
+# Landmark speed thresholds, in normalized image units per second, for the
+# MOTION_PERCENTILE of the speeds of the visible landmarks. Above FAST_MOTION we
+# sample more often, below STILL_MOTION less often. Calibrated on the bundled
+# curl clips so the effective rate stays close to target_hz while someone is
+# exercising (e.g. 14 Hz for a target of 15 on 60 fps input).
+MOTION_PERCENTILE = 75
+FAST_MOTION = 1.2
+STILL_MOTION = 0.15
+
+# Fewer visible landmarks than this and the speed is not measured
+MIN_VISIBLE_LANDMARKS = 4
+
+# Fallback when a video does not report its frame rate
+DEFAULT_SOURCE_FPS = 30.0
+
+# Function to describe the sampler configuration (used in cache keys)
+def sampler_settings(target_hz=DEFAULT_TARGET_HZ):
+    if target_hz is None:
+        return None
+    return {
+        'target_hz': target_hz,
+        'motion_percentile': MOTION_PERCENTILE,
+        'fast_motion': FAST_MOTION,
+        'still_motion': STILL_MOTION,
+    }
+
+# Decides which frames are sent to pose inference.
+# The base step gives target_hz samples per second of video. While landmarks move
+# fast the step shrinks (up to 2x target_hz) and while the subject is still it
+# grows (down to target_hz / 2). Frame numbers start at 1, as in process_video.
+class AdaptiveSampler:
+    def __init__(self, source_fps, target_hz=DEFAULT_TARGET_HZ,
+                 fast_motion=FAST_MOTION, still_motion=STILL_MOTION):
+        if not source_fps or math.isnan(source_fps) or source_fps <= 0:
+            source_fps = DEFAULT_SOURCE_FPS
+
+        self.source_fps = source_fps
+        self.fast_motion = fast_motion
+        self.still_motion = still_motion
+
+        self.base_step = max(1, round(source_fps / target_hz))
+        self.min_step = max(1, round(source_fps / (target_hz * 2)))
+        self.max_step = max(self.base_step, round(source_fps / (target_hz / 2)))
+
+        self.step = self.base_step
+        self.next_frame = 1
+        self._last_frame = None
+        self._last_points = None
+
+    def should_sample(self, frame_number):
+        return frame_number >= self.next_frame
+
+    # Function to record the landmarks of a sampled frame and pick the next frame.
+    # points is an array of landmark (x, y, z, visibility) rows, or None if no pose was found.
+    # Rows without a visibility column count as visible.
+    def update(self, frame_number, points):
+        if points is None:
+            # Lost the subject, go back to the nominal rate until we find them again
+            self.step = self.base_step
+            self._last_points = None
+        else:
+            points = np.asarray(points, dtype=np.float32)
+            if self._last_points is not None:
+                speed = self._speed(points, frame_number)
+
+                if speed is None:
+                    pass
+                elif speed > self.fast_motion:
+                    self.step = max(self.min_step, self.step // 2)
+                elif speed < self.still_motion:
+                    self.step = min(self.max_step, self.step + 1)
+                elif self.step < self.base_step:
+                    self.step += 1
+                elif self.step > self.base_step:
+                    self.step -= 1
+
+            self._last_frame = frame_number
+            self._last_points = points
+
+        self.next_frame = frame_number + self.step
+
+    # Function to measure how fast the visible landmarks moved since the last sampled frame.
+    # Hidden landmarks are guessed by the model and jump around, so they are left out,
+    # and a percentile instead of the maximum keeps one jittery landmark from deciding.
+    def _speed(self, points, frame_number):
+        if points.shape[1] > 3:
+            visible = (points[:, 3] >= ROI_MIN_VISIBILITY) & (self._last_points[:, 3] >= ROI_MIN_VISIBILITY)
+        else:
+            visible = np.ones(len(points), dtype=bool)
+        if visible.sum() < MIN_VISIBLE_LANDMARKS:
+            return None
+
+        elapsed = (frame_number - self._last_frame) / self.source_fps
+        moved = np.abs(points[visible, :2] - self._last_points[visible, :2]).max(axis=1)
+        return np.percentile(moved, MOTION_PERCENTILE) / elapsed
@@ -1,9 +1,54 @@
 import cv2
-from train_and_test_model import predict_bicep_curls, train_model
-from extract_features_from_videos import correct_features, incorrect_features
+import numpy as np
+from collections import deque
+from extract_features_from_videos import extract_frame_features
+from process_video import create_pose, landmarks_to_array
+from frame_sampler import AdaptiveSampler
+from roi_cropper import PoseCropper
+from quality_tiers import DEFAULT_TIER, tier_settings
+
+# Keeps running aggregates of the per-frame joint angles so the likeliness can be
+# updated as frames pass through once, instead of re-processing the whole video.
+# With window=None the mean covers every frame seen so far (the same feature the
+# model was trained on); otherwise it is a rolling mean over the last `window` frames.
+class StreamingLikelinessScorer:
+    def __init__(self, model, window=None):
+        self.model = model
+        self.window = window
+        self._recent = deque()
+        self._sum = np.zeros(2, dtype=np.float64)
+        self._count = 0
+
+    # Function to add the keypoints of one frame, shape (33, 4)
+    def update(self, keypoints):
+        frame_features = extract_frame_features(keypoints[np.newaxis])
+        if len(frame_features) == 0:
+            return
+
+        self._sum += frame_features[0]
+        self._count += 1
+
+        # Drop the oldest frame once the rolling window is full
+        if self.window is not None:
+            self._recent.append(frame_features[0])
+            if len(self._recent) > self.window:
+                self._sum -= self._recent.popleft()
+                self._count -= 1
+
+    # Function to score the current aggregate, same output as predict_bicep_curls
+    def likeliness(self):
+        if self._count == 0:
+            return 0.0
+
+        features = (self._sum / self._count).reshape(1, -1)
+        prediction = self.model.predict_proba(features)
+        if len(prediction[0]) > 1:
+            return prediction[0][1]
+        else:
+            return prediction[0][0]
 
 # Generate a video with likeliness percentage overlay
-def generate_likeliness_video(model, input_video_path, output_video_path):
+def generate_likeliness_video(model, input_video_path, output_video_path, window=None, tier=DEFAULT_TIER):
     cap = cv2.VideoCapture(input_video_path)
 
     # Set up video writer to save the output video with likeliness overlay
@@ -13,6 +58,13 @@ def generate_likeliness_video(model, input_video_path, output_video_path):
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
 
+    # Single pose pass: sample frames the same way as training, feed the scorer as we go
+    settings = tier_settings(tier)
+    pose_instance = create_pose(tier)
+    sampler = AdaptiveSampler(cap.get(cv2.CAP_PROP_FPS), settings['target_hz'])
+    cropper = PoseCropper(settings['inference_width'])
+    scorer = StreamingLikelinessScorer(model, window=window)
+
     frame_count = 0
 
     while cap.isOpened():
@@ -22,10 +74,17 @@ def generate_likeliness_video(model, input_video_path, output_video_path):
 
         frame_count += 1
 
+        if sampler.should_sample(frame_count):
+            results = cropper.process(pose_instance, frame)
+            keypoints = landmarks_to_array(results.pose_landmarks) if results.pose_landmarks else None
+            if keypoints is not None:
+                scorer.update(keypoints)
+            sampler.update(frame_count, keypoints)
+
         # Every 10 frames, we calculate the likeliness and overlay it
         if frame_count % 10 == 0:
-            # Predict the likeliness of the video being a bicep curl
-            likeliness = predict_bicep_curls(model, input_video_path) * 100  # Convert to percentage
+            # Likeliness of the frames seen so far being a bicep curl
+            likeliness = scorer.likeliness() * 100  # Convert to percentage
 
             # Overlay the text on the frame
             cv2.putText(frame, f'Likeliness: {likeliness:.2f}%', (50, 50), 
@@ -36,14 +95,19 @@ def generate_likeliness_video(model, input_video_path, output_video_path):
 
     cap.release()
     out.release()
+    pose_instance.close()
 
-# Example usage
+# Example usage (run "python pipeline.py all" first to train the model)
 if __name__ == "__main__":
+    import os
+    from pipeline import DEFAULT_WORK_DIR, MODEL_FILE
+    from train_and_test_model import load_model
+
     test_video_path = 'D:\\ProFormAI\\ProFormAI\\src\\testing\\f1.mp4'
     output_video_path = 'D:/temp downloads/likeliness.mp4'
 
-    # Train the model
-    model = train_model(correct_features, incorrect_features)
+    # Load the trained model
+    model = load_model(os.path.join(DEFAULT_WORK_DIR, MODEL_FILE))
 
     # Generate video with likeliness overlay
     generate_likeliness_video(model, test_video_path, output_video_path)
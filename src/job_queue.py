@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Raised by submit when the queue has no room left
+class QueueFullError(Exception):
+    pass
+
+# Raised inside a job when it notices it has been cancelled
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self):
+        info = {'job_id': self.id, 'status': self.status}
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+# Bounded job scheduler backed by a fixed pool of worker threads.
+# Jobs are called as func(cancel_event, *args, **kwargs).
+# Only the last max_finished finished jobs are kept; on_prune(job) is called for
+# every job dropped, e.g. to delete the files it wrote.
+class JobQueue:
+    def __init__(self, num_workers=2, max_queued=8, max_finished=1000, on_prune=None):
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_finished = max_finished
+        self._on_prune = on_prune
+
+        self._workers = []
+        for i in range(num_workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    # Function to queue a job, raises QueueFullError instead of blocking
+    def submit(self, func, *args, **kwargs):
+        job = Job(func, args, kwargs)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError('Job queue is full, try again later.')
+            self._jobs[job.id] = job
+            pruned = self._prune()
+
+        # Outside the lock, the callback may touch the disk
+        if self._on_prune is not None:
+            for old_job in pruned:
+                try:
+                    self._on_prune(old_job)
+                except Exception:
+                    logging.exception(f"Cleaning up job {old_job.id} failed")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # Function to cancel a job; queued jobs are skipped, running jobs are asked to stop
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job.cancel_event.set()
+            if job.status == JOB_QUEUED:
+                job.status = JOB_CANCELLED
+            return True
+
+    # Drop the oldest finished jobs so the job table stays bounded, returns the dropped jobs
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        return [self._jobs.pop(job_id) for job_id in finished[:max(0, len(finished) - self._max_finished)]]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status == JOB_CANCELLED:
+                    self._queue.task_done()
+                    continue
+                job.status = JOB_RUNNING
+
+            try:
+                result = job.func(job.cancel_event, *job.args, **job.kwargs)
+            except JobCancelled:
+                status, result, error = JOB_CANCELLED, None, None
+            except Exception as e:
+                logging.exception(f"Job {job.id} failed")
+                status, result, error = JOB_FAILED, None, str(e)
+            else:
+                status, error = JOB_DONE, None
+
+            with self._lock:
+                job.status = status
+                job.result = result
+                job.error = error
+            self._queue.task_done()
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+
+# Bump this whenever the layout of the stored landmark arrays changes
+CACHE_VERSION = 2
+
+# Folder holding one .npy file per (video content, pose settings) pair
+CACHE_DIR = os.environ.get(
+    'PROFORMAI_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.keypoint_cache')
+)
+
+# Remember content hashes for files we already hashed in this process,
+# keyed by (path, size, mtime) so an edited file is hashed again
+_hash_memo = {}
+
+# Function to hash the content of a video file in fixed-size blocks
+def file_hash(file_path, block_size=1 << 20):
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+    _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+# Function to build the cache key from the video content and the pose settings
+def cache_key(file_path, settings):
+    settings_blob = json.dumps({'version': CACHE_VERSION, 'settings': settings}, sort_keys=True)
+    settings_hash = hashlib.sha256(settings_blob.encode('utf-8')).hexdigest()[:16]
+    return f"{file_hash(file_path)}-{settings_hash}"
+
+def _entry_path(key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, key + '.npy')
+
+# Function to load cached keypoints, returns None if there is no valid entry
+def load_keypoints(file_path, settings, cache_dir=None):
+    path = _entry_path(cache_key(file_path, settings), cache_dir)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        # Memory-map the array so only the frames we touch are read from disk
+        keypoints = np.load(path, mmap_mode='r')
+    except (OSError, ValueError, EOFError):
+        # Truncated or corrupt entry (an empty file raises EOFError), delete it and recompute
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    if keypoints.ndim != 3:
+        return None
+    return keypoints
+
+# Function to store the keypoints of a video in the cache
+def save_keypoints(file_path, settings, keypoints, cache_dir=None):
+    path = _entry_path(cache_key(file_path, settings), cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file first so readers never see a partial entry.
+    # The name is unique per call, so threads caching the same video don't collide.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.asarray(keypoints, dtype=np.float32))
+    os.replace(tmp_path, path)
+    return path
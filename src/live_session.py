@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+import uuid
+import cv2
+import numpy as np
+from rep_segmentation import segment_reps, elbow_angles_from_vectors
+from metrics import REGISTRY, stage_seconds
+
+live_frames_total = REGISTRY.counter(
+    'proformai_live_frames_total', 'Live session frames, by what happened to them', ['result'])
+
+# Frames older than this (client timestamp to server receive) are dropped
+LIVE_LATENCY_BUDGET_MS = 200
+
+# Feedback is sent after every detected rep. If no rep is found within this
+# many hand vectors, feedback for the whole window is sent instead.
+LIVE_FEEDBACK_WINDOW = 150
+
+# Sessions without frames for this long are closed
+LIVE_SESSION_TIMEOUT = 60
+
+# Raised when no more live sessions can be opened
+class TooManySessionsError(Exception):
+    pass
+
+# One live webcam session. It keeps one Pose instance for as long as it is open,
+# so MediaPipe keeps tracking the person from frame to frame instead of
+# re-detecting them. release_pose(pose_instance) is called on close, e.g. to
+# return the instance to a pool; without it the instance is closed.
+# Only one frame per session is processed at a time; frames that arrive while
+# the previous one is still running, or that are already older than the
+# latency budget, are dropped instead of queued.
+class LiveSession:
+    def __init__(self, pose_instance, extract_vector, compare, reference_vectors,
+                 latency_budget_ms=LIVE_LATENCY_BUDGET_MS, feedback_window=LIVE_FEEDBACK_WINDOW, release_pose=None):
+        self.id = uuid.uuid4().hex
+        self.pose = pose_instance
+        self.release_pose = release_pose
+        self.extract_vector = extract_vector
+        self.compare = compare
+        self.reference_vectors = reference_vectors
+        self.latency_budget_ms = latency_budget_ms
+        self.feedback_window = feedback_window
+
+        self.vectors = []
+        self.vector_times = []
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.reps_completed = 0
+        self.windows_completed = 0
+        self.last_latency_ms = None
+        self.last_seen = time.monotonic()
+
+        self._lock = threading.Lock()
+        # Guards the frame counters, which are updated while another frame holds _lock
+        self._counter_lock = threading.Lock()
+
+    # Function to run pose tracking on one encoded (e.g. JPEG) frame
+    def submit_frame(self, frame_bytes, client_timestamp_ms=None):
+        received = time.time()
+        self.last_seen = time.monotonic()
+        with self._counter_lock:
+            self.frames_received += 1
+
+        # Drop frames that already used up their latency budget on the way here
+        if client_timestamp_ms is not None and received * 1000 - client_timestamp_ms > self.latency_budget_ms:
+            return self._dropped('stale')
+
+        # Drop instead of waiting if the previous frame is still being processed
+        if not self._lock.acquire(blocking=False):
+            return self._dropped('busy')
+
+        try:
+            frame = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return {'status': 'error', 'error': 'Could not decode frame'}
+
+            with stage_seconds.time('pose_process'):
+                results = self.pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            with self._counter_lock:
+                self.frames_processed += 1
+            live_frames_total.inc('processed')
+
+            response = {'status': 'processed', 'pose_detected': bool(results.pose_landmarks)}
+            if results.pose_landmarks:
+                hand_vector = self.extract_vector(results.pose_landmarks.landmark)
+                if hand_vector is not None:
+                    self.vectors.append(hand_vector)
+                    self.vector_times.append(received)
+                    response.update(self._rep_feedback())
+
+            self.last_latency_ms = (time.time() - received) * 1000
+            response['latency_ms'] = round(self.last_latency_ms, 1)
+            response['over_budget'] = self.last_latency_ms > self.latency_budget_ms
+            return response
+        finally:
+            self._lock.release()
+
+    # Function to send feedback for the rep that just finished, if any.
+    # The buffer only holds the current rep, so the work per frame stays bounded.
+    def _rep_feedback(self):
+        reps = segment_reps(elbow_angles_from_vectors(self.vectors),
+                            timestamps=np.asarray(self.vector_times), final=False)
+        if reps:
+            rep = reps[0]
+            feedback = {
+                'feedback': self.compare(self.vectors[rep['start']:rep['end'] + 1], self.reference_vectors),
+                'rep': self.reps_completed,
+                'rep_stats': rep,
+            }
+            self.reps_completed += 1
+            # The peak that ended this rep starts the next one
+            self.vectors = self.vectors[rep['end']:]
+            self.vector_times = self.vector_times[rep['end']:]
+            return feedback
+
+        # No rep found in a full window, send feedback for the window instead
+        if len(self.vectors) >= self.feedback_window:
+            feedback = {
+                'feedback': self.compare(self.vectors, self.reference_vectors),
+                'window': self.windows_completed,
+            }
+            self.windows_completed += 1
+            self.vectors = []
+            self.vector_times = []
+            return feedback
+
+        return {}
+
+    def _dropped(self, reason):
+        with self._counter_lock:
+            self.frames_dropped += 1
+        live_frames_total.inc('dropped_' + reason)
+        return {'status': 'dropped', 'reason': reason}
+
+    def stats(self):
+        with self._counter_lock:
+            frames = (self.frames_received, self.frames_processed, self.frames_dropped)
+        return {
+            'session_id': self.id,
+            'frames_received': frames[0],
+            'frames_processed': frames[1],
+            'frames_dropped': frames[2],
+            'reps_completed': self.reps_completed,
+            'windows_completed': self.windows_completed,
+            'last_latency_ms': self.last_latency_ms,
+            'latency_budget_ms': self.latency_budget_ms,
+        }
+
+    def close(self):
+        with self._lock:
+            if self.release_pose is not None:
+                self.release_pose(self.pose)
+            else:
+                self.pose.close()
+
+# Keeps track of the open live sessions and closes idle ones
+class LiveSessionRegistry:
+    def __init__(self, max_sessions=4, timeout=LIVE_SESSION_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+        self._sessions = {}
+        # Slots taken by sessions that are still being built
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    # Function to open a session; session_factory builds the LiveSession.
+    # A slot is reserved under the lock, but the session is built outside it,
+    # so a slow factory doesn't hold up other sessions.
+    def create(self, session_factory):
+        self.expire_idle()
+        with self._lock:
+            if len(self._sessions) + self._reserved >= self.max_sessions:
+                raise TooManySessionsError('Too many live sessions, try again later.')
+            self._reserved += 1
+
+        try:
+            session = session_factory()
+        except Exception:
+            with self._lock:
+                self._reserved -= 1
+            raise
+
+        with self._lock:
+            self._reserved -= 1
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def expire_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [session_id for session_id, session in self._sessions.items()
+                       if now - session.last_seen > self.timeout]
+        for session_id in expired:
+            logging.info(f"Closing idle live session {session_id}")
+            self.close(session_id)
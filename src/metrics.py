@@ -0,0 +1,165 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Small in-process metrics (counters, gauges, histograms) rendered in the
+# Prometheus text exposition format by the /metrics route.
+# Label values are passed positionally, in the order of the metric's label names.
+
+# Histogram buckets in seconds, from per-frame stages up to whole requests
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name, label_values, None, value
+
+class Gauge:
+    type_name = 'gauge'
+
+    # callback, when given, is called at render time to read the current value
+    def __init__(self, name, help_text, label_names=(), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def samples(self):
+        if self.callback is not None:
+            yield self.name, (), None, self.callback()
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name, label_values, None, value
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    # Context manager that observes the time spent inside the with block
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series['count'] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(label_values, dict(series, counts=list(series['counts'])))
+                     for label_values, series in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                yield self.name + '_bucket', label_values, ('le', _format_value(bound)), cumulative
+            yield self.name + '_sum', label_values, None, series['sum']
+            yield self.name + '_count', label_values, None, series['count']
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=(), callback=None):
+        return self._register(Gauge(name, help_text, label_names, callback))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    # Function to render every metric in the Prometheus text format
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for sample_name, label_values, extra, value in metric.samples():
+                labels = _format_labels(metric.label_names, label_values, extra)
+                lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# Metrics shared by the processing modules
+stage_seconds = REGISTRY.histogram(
+    'proformai_stage_seconds', 'Time spent in each processing stage per frame or call', ['stage'])
+frames_total = REGISTRY.counter(
+    'proformai_frames_total', 'Video frames seen, by what happened to them', ['result'])
+queue_depth = REGISTRY.gauge(
+    'proformai_queue_depth', 'Items waiting in a queue, as last observed', ['queue'])
@@ -0,0 +1,195 @@
+import argparse
+import csv
+import os
+import sys
+
+# Training pipeline: ingest -> features -> train -> evaluate.
+# Every stage runs only when asked for and reads what the previous stage left
+# in the work folder, e.g.:
+#   python pipeline.py manifest
+#   python pipeline.py ingest --workers 8 --manifest pipeline_output/manifest.json
+#   python pipeline.py features
+#   python pipeline.py train
+#   python pipeline.py evaluate --video testing/f1.mp4
+#   python pipeline.py score --video-dir uploads --output scores.csv
+#   python pipeline.py all
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CORRECT_DIR = os.path.join(SRC_DIR, 'Bicep Curls cor')
+DEFAULT_INCORRECT_DIR = os.path.join(SRC_DIR, 'Bicep Curls incor')
+DEFAULT_WORK_DIR = os.path.join(SRC_DIR, 'pipeline_output')
+DEFAULT_TEST_VIDEO = os.path.join(SRC_DIR, 'testing', 'f1.mp4')
+
+FEATURE_STORE_DIR = 'feature_store'
+MODEL_FILE = 'model.pkl'
+MANIFEST_FILE = 'manifest.json'
+
+def _store_path(args):
+    return os.path.join(args.work_dir, FEATURE_STORE_DIR)
+
+def _model_path(args):
+    return os.path.join(args.work_dir, MODEL_FILE)
+
+def _manifest_path(args):
+    return args.manifest or os.path.join(args.work_dir, MANIFEST_FILE)
+
+def _require(path, stage):
+    if not os.path.exists(path):
+        sys.exit(f"{path} not found, run the '{stage}' stage first.")
+
+# Stage 0: index the unique labelled videos of the corpus (see dataset_manifest.py)
+def manifest(args):
+    from dataset_manifest import build_manifest, save_manifest, print_summary
+
+    corpus_manifest = build_manifest(args.corpus_dir)
+    save_manifest(corpus_manifest, _manifest_path(args))
+    print_summary(corpus_manifest)
+    print(f"Saved manifest to {_manifest_path(args)}")
+
+# Function to list the training videos as (path, label, content hash) tuples,
+# from the manifest when --manifest is given, otherwise from the two folders
+def _labelled_videos(args):
+    if args.manifest:
+        from dataset_manifest import load_manifest
+
+        _require(args.manifest, 'manifest')
+        corpus_manifest = load_manifest(args.manifest)
+        return [(os.path.join(corpus_manifest['root'], video['path']), video['label'], video['hash'])
+                for video in corpus_manifest['videos']]
+
+    videos = []
+    for folder, label in [(args.correct_dir, 'correct'), (args.incorrect_dir, 'incorrect')]:
+        videos += [(os.path.join(folder, file_name), label, None)
+                   for file_name in sorted(os.listdir(folder)) if file_name.endswith('.mp4')]
+    return videos
+
+# Stage 1: run pose estimation over the training videos (results land in the keypoint cache)
+def ingest(args):
+    from process_video import process_videos
+
+    videos = _labelled_videos(args)
+
+    print("Processing correct form videos...")
+    correct_keypoints = process_videos([path for path, label, _ in videos if label == 'correct'],
+                                       workers=args.workers, tier=args.tier)
+
+    print("Processing incorrect form videos...")
+    incorrect_keypoints = process_videos([path for path, label, _ in videos if label == 'incorrect'],
+                                         workers=args.workers, tier=args.tier)
+
+    return correct_keypoints, incorrect_keypoints
+
+# Stage 2: write the keypoints and per-frame features of every video to the
+# feature store (see feature_store.py), one video at a time
+def features(args):
+    from feature_store import FeatureStoreWriter
+    from process_video import process_video
+
+    # Fill the keypoint cache with the worker pool first, the loop below then reads from it
+    if args.workers != 1:
+        ingest(args)
+
+    videos = _labelled_videos(args)
+    print("Extracting features...")
+    with FeatureStoreWriter(_store_path(args), tier=args.tier) as writer:
+        for path, label, content_hash in videos:
+            writer.add(path, label, process_video(path, tier=args.tier), content_hash)
+    print(f"Saved {len(videos)} videos to the feature store in {_store_path(args)}")
+
+# Stage 3: train the classifier on the feature store and save the model
+def train(args):
+    from feature_store import FeatureStore, INDEX_FILE
+    from train_and_test_model import train_model, save_model
+
+    _require(os.path.join(_store_path(args), INDEX_FILE), 'features')
+    store = FeatureStore(_store_path(args))
+    print(f"Training on features extracted at the '{store.index.get('tier')}' quality tier")
+
+    # Mean features per video, read from the memory-mapped store one video at a time
+    correct_features = store.video_means('correct')
+    incorrect_features = store.video_means('incorrect')
+
+    print("Training the model...")
+    model = train_model(correct_features, incorrect_features)
+    save_model(model, _model_path(args))
+    print(f"Saved model to {_model_path(args)}")
+
+# Stage 4: score test videos with the saved model
+def evaluate(args):
+    from train_and_test_model import get_model, predict_bicep_curls_batch
+
+    _require(_model_path(args), 'train')
+    model = get_model(_model_path(args))
+
+    video_paths = args.video or [DEFAULT_TEST_VIDEO]
+    likelihoods = predict_bicep_curls_batch(model, video_paths, workers=args.workers, tier=args.tier)
+    for video_path, likeliness in zip(video_paths, likelihoods):
+        print(f'Likeliness of {video_path} being bicep curls: {likeliness * 100:.2f}%')
+
+# Batch scoring: score every video given with --video and in --video-dir, optionally writing a CSV
+def score(args):
+    from train_and_test_model import get_model, predict_bicep_curls_batch
+
+    _require(_model_path(args), 'train')
+    model = get_model(_model_path(args))
+
+    video_paths = list(args.video or [])
+    if args.video_dir:
+        video_paths += [os.path.join(args.video_dir, file_name)
+                        for file_name in sorted(os.listdir(args.video_dir))
+                        if file_name.endswith('.mp4')]
+    if not video_paths:
+        sys.exit('No videos to score, pass --video or --video-dir.')
+
+    likelihoods = predict_bicep_curls_batch(model, video_paths, workers=args.workers, tier=args.tier)
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['video', 'likeliness'])
+            writer.writerows(zip(video_paths, likelihoods))
+        print(f"Saved {len(video_paths)} scores to {args.output}")
+    else:
+        for video_path, likeliness in zip(video_paths, likelihoods):
+            print(f'{video_path}: {likeliness * 100:.2f}%')
+
+def run_all(args):
+    features(args)
+    train(args)
+
+STAGES = {
+    'manifest': manifest,
+    'ingest': ingest,
+    'features': features,
+    'train': train,
+    'evaluate': evaluate,
+    'score': score,
+    'all': run_all,
+}
+
+def build_parser():
+    from quality_tiers import QUALITY_TIERS, DEFAULT_TIER
+
+    parser = argparse.ArgumentParser(description='ProFormAI training pipeline.')
+    parser.add_argument('stage', choices=list(STAGES))
+    parser.add_argument('--correct-dir', default=DEFAULT_CORRECT_DIR, help='Folder with correct form videos')
+    parser.add_argument('--incorrect-dir', default=DEFAULT_INCORRECT_DIR, help='Folder with incorrect form videos')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help='Where features and the model are stored')
+    parser.add_argument('--manifest', help='Dataset manifest to read the training videos from, instead of the '
+                                           'folders (the manifest stage writes it here, default: work dir)')
+    parser.add_argument('--corpus-dir', default=SRC_DIR, help='Folder the manifest stage searches for videos')
+    parser.add_argument('--tier', choices=list(QUALITY_TIERS), default=DEFAULT_TIER,
+                        help='Quality tier: Pose model, inference resolution and sampling rate')
+    parser.add_argument('--workers', type=int, default=None, help='Ingestion worker processes (default: all cores)')
+    parser.add_argument('--video', action='append', help='Video to score in the evaluate/score stages (repeatable)')
+    parser.add_argument('--video-dir', help='Folder of videos to score in the score stage')
+    parser.add_argument('--output', help='CSV file for the score stage results')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    STAGES[args.stage](args)
+
+if __name__ == "__main__":
+    main()
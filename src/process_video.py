@@ -1,55 +1,196 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import keypoint_cache
+from frame_sampler import AdaptiveSampler, sampler_settings
+from roi_cropper import PoseCropper, roi_settings
+from quality_tiers import DEFAULT_TIER, tier_settings, pose_settings
 
-# Initialize Mediapipe pose detection
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
+# Pose settings of the default tier
+POSE_SETTINGS = pose_settings(DEFAULT_TIER)
 
-def process_video(file_path):
+# Function to build the settings that identify a cached keypoint array
+def cache_settings(tier=DEFAULT_TIER):
+    settings = tier_settings(tier)
+    return {'pose': pose_settings(tier), 'sampler': sampler_settings(settings['target_hz']),
+            'roi': roi_settings(settings['inference_width'])}
+
+# Function to load Mediapipe's pose solution. Mediapipe is only imported here,
+# on first use, because importing it takes about a second.
+def load_mp_pose():
+    import mediapipe as mp
+    return mp.solutions.pose
+
+# Function to create a Mediapipe Pose instance with the settings of a quality tier
+def create_pose(tier=DEFAULT_TIER):
+    return load_mp_pose().Pose(**pose_settings(tier))
+
+# Shared Pose instances for single-process use, one per tier, created on first use.
+# process_video resets the instance before every video.
+_poses = {}
+
+def get_pose(tier=DEFAULT_TIER):
+    if tier not in _poses:
+        _poses[tier] = create_pose(tier)
+    return _poses[tier]
+
+# Keypoints are stored as float32 arrays of shape (frames, NUM_LANDMARKS, 4),
+# holding x, y, z and visibility for every landmark
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = 4
+
+# Function to convert Mediapipe pose landmarks to a (33, 4) array
+def landmarks_to_array(pose_landmarks):
+    return np.array(
+        [(landmark.x, landmark.y, landmark.z, landmark.visibility) for landmark in pose_landmarks.landmark],
+        dtype=np.float32
+    )
+
+# Function to extract keypoints from a video.
+# The quality tier sets the Pose model, the rate frames are sampled at (adaptively,
+# see frame_sampler.py) and the width pose inference runs at (on a crop around
+# the person, see roi_cropper.py). pose_instance must match the tier.
+def process_video(file_path, use_cache=True, pose_instance=None, tier=DEFAULT_TIER):
+    # Reuse the keypoints from a previous run if this video was already processed
+    if use_cache:
+        cached = keypoint_cache.load_keypoints(file_path, cache_settings(tier))
+        if cached is not None:
+            return cached
+
+    if pose_instance is None:
+        pose_instance = get_pose(tier)
+    # Start without the tracking state of the previous video, so the keypoints
+    # (and their cache entry) don't depend on what the instance processed before
+    pose_instance.reset()
+
+    settings = tier_settings(tier)
     video = cv2.VideoCapture(file_path)
     keypoints_list = []
+    sampler = AdaptiveSampler(video.get(cv2.CAP_PROP_FPS), settings['target_hz']) if settings['target_hz'] else None
+    cropper = PoseCropper(settings['inference_width'])
+    frame_number = 0
     
     while video.isOpened():
         ret, frame = video.read()
         if not ret:
             break
 
-        # Convert frame to RGB (Mediapipe expects RGB images)
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame_number += 1
+        if sampler and not sampler.should_sample(frame_number):
+            continue
+
+        # Crop around the person, downscale and convert to RGB (Mediapipe expects RGB images)
+        image_rgb = cropper.prepare(frame)
         
-        # Process the frame to extract pose landmarks
-        results = pose.process(image_rgb)
+        # Process the frame to extract pose landmarks, in full-frame coordinates
+        results = cropper.finish(pose_instance.process(image_rgb))
         
         # If pose landmarks are detected, extract keypoints
+        keypoints = None
         if results.pose_landmarks:
-            keypoints = []
-            for landmark in results.pose_landmarks.landmark:
-                keypoints.append([landmark.x, landmark.y, landmark.z])
+            keypoints = landmarks_to_array(results.pose_landmarks)
             keypoints_list.append(keypoints)
 
+        if sampler:
+            sampler.update(frame_number, keypoints)
+
     video.release()
-    return keypoints_list  # Return as list, not numpy array
 
-def process_videos_in_folder(folder_path):
-    all_keypoints = []
-    
-    # Loop through all files in the folder
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith(".mp4"):
-            file_path = os.path.join(folder_path, file_name)
-            print(f"Processing {file_path}...")
-            keypoints = process_video(file_path)
-            all_keypoints.append(keypoints)  # Append each video's keypoints as a list
-    
-    return all_keypoints  # Return a list of lists, where each element is the keypoints for a video
-
-# Example usage: Process all videos in folders
-<<<<<<< HEAD
-correct_keypoints = process_videos_in_folder(r'C:\Users\abhin\Desktop\ProFormAI\ProFormAI\src\Bicep Curls cor')
-correct_keypoints = process_videos_in_folder('C:\\Users\\abhin\\Desktop\\ProFormAI\\ProFormAI\\src\\Bicep Curls cor')
-=======
-correct_keypoints = process_videos_in_folder('D:\\ProFormAI\\ProFormAI\\src\\Bicep Curls cor')
-incorrect_keypoints = process_videos_in_folder('D:\\ProFormAI\\ProFormAI\\src\\Bicep Curls incor')
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
+    # Stack into one contiguous (frames, 33, 4) array
+    if keypoints_list:
+        keypoints_array = np.stack(keypoints_list)
+    else:
+        keypoints_array = np.empty((0, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+
+    if use_cache:
+        keypoint_cache.save_keypoints(file_path, cache_settings(tier), keypoints_array)
+
+    return keypoints_array
+
+# Pose instance owned by a worker process of the parallel ingestion pool
+_worker_pose = None
+
+def _init_worker(tier):
+    global _worker_pose
+    _worker_pose = create_pose(tier)
+
+# With the cache on, the worker only fills the cache and the parent memory-maps
+# the result, so large keypoint arrays aren't pickled back or held in memory
+def _process_video_worker(file_path, use_cache, tier):
+    keypoints = process_video(file_path, use_cache=use_cache, pose_instance=_worker_pose, tier=tier)
+    return None if use_cache else keypoints
+
+# Function to process a list of videos, optionally spread across worker processes.
+# With skip_failed, a video that can't be read or processed is logged and gets an
+# empty keypoint array instead of stopping the whole batch.
+def process_videos(file_paths, use_cache=True, workers=1, tier=DEFAULT_TIER, skip_failed=False):
+    results = [None] * len(file_paths)
+    pending = []
+
+    # Function to record a failed video, or re-raise without skip_failed
+    def failed(index, error):
+        if not skip_failed:
+            raise error
+        logging.warning(f"Could not process {file_paths[index]}: {error}")
+        results[index] = np.empty((0, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+
+    # Serve cache hits in this process, only send the misses to the workers
+    for index, file_path in enumerate(file_paths):
+        try:
+            cached = keypoint_cache.load_keypoints(file_path, cache_settings(tier)) if use_cache else None
+        except OSError as e:
+            failed(index, e)
+            continue
+        if cached is not None:
+            print(f"Loaded {file_path} from cache")
+            results[index] = cached
+        else:
+            pending.append(index)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(pending))
+
+    if workers <= 1:
+        for done, index in enumerate(pending, 1):
+            print(f"Processing {file_paths[index]}... ({done}/{len(pending)})")
+            try:
+                results[index] = process_video(file_paths[index], use_cache=use_cache, tier=tier)
+            except Exception as e:
+                failed(index, e)
+        return results
+
+    # Each worker process builds its own Pose instance in _init_worker.
+    # Use spawn: forking a process that already runs a MediaPipe graph crashes the child.
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tier,),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {
+            executor.submit(_process_video_worker, file_paths[index], use_cache, tier): index
+            for index in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+                if use_cache:
+                    results[index] = keypoint_cache.load_keypoints(file_paths[index], cache_settings(tier))
+            except Exception as e:
+                failed(index, e)
+                continue
+            print(f"Processed {file_paths[index]} ({done}/{len(pending)})")
+
+    # Results are stored by input position, so the order is deterministic
+    return results
+
+def process_videos_in_folder(folder_path, use_cache=True, workers=1, tier=DEFAULT_TIER):
+    # Sort the file names so the output order does not depend on the file system
+    file_paths = [
+        os.path.join(folder_path, file_name)
+        for file_name in sorted(os.listdir(folder_path))
+        if file_name.endswith(".mp4")
+    ]
+    # Return a list with one (frames, 33, 4) keypoint array per video
+    return process_videos(file_paths, use_cache=use_cache, workers=workers, tier=tier)
@@ -0,0 +1,117 @@
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# Named quality tiers. Each tier sets the MediaPipe Pose model (0 = lite,
+# 1 = full, 2 = heavy), the width frames are scaled down to before inference
+# (see roi_cropper.py) and the rate frames are sampled at (see frame_sampler.py).
+# Training and serving use the same tiers, and all three settings are part of
+# the keypoint cache key, so keypoints of different tiers never mix.
+QUALITY_TIERS = {
+    'fast': {'model_complexity': 0, 'inference_width': 480, 'target_hz': 10.0},
+    'balanced': {'model_complexity': 1, 'inference_width': 640, 'target_hz': 15.0},
+    'accurate': {'model_complexity': 2, 'inference_width': 1280, 'target_hz': 30.0},
+}
+
+DEFAULT_TIER = 'balanced'
+
+# Pose settings shared by every tier
+BASE_POSE_SETTINGS = {
+    'static_image_mode': False,  # Video mode: track the person from frame to frame
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.5,
+}
+
+# Function to get the settings of a tier, raises ValueError for an unknown tier
+def tier_settings(tier=DEFAULT_TIER):
+    if not isinstance(tier, str) or tier not in QUALITY_TIERS:
+        raise ValueError(f"Unknown quality tier: {tier} (choose from {', '.join(QUALITY_TIERS)})")
+    return QUALITY_TIERS[tier]
+
+# Function to build the keyword arguments of mp.solutions.pose.Pose for a tier
+def pose_settings(tier=DEFAULT_TIER):
+    return dict(BASE_POSE_SETTINGS, model_complexity=tier_settings(tier)['model_complexity'])
+
+# Pool of ready-to-use Pose instances, up to `size` per tier. Instances are
+# created (and run once on a blank frame, so the model is loaded) ahead of time
+# for the tiers in `prewarm`, and on first use for the others (or when pre-warming
+# fails, e.g. because the model can't be downloaded). acquire() (or
+# checkout()) blocks while all instances of a tier are in use, so no two threads share one.
+class PosePool:
+    def __init__(self, create_pose, size=2, prewarm=()):
+        self._create_pose = create_pose
+        self.size = size
+        self._idle = {tier: [] for tier in QUALITY_TIERS}
+        self._created = {tier: 0 for tier in QUALITY_TIERS}
+        self._condition = threading.Condition()
+
+        for tier in prewarm:
+            tier_settings(tier)
+            try:
+                for _ in range(size):
+                    self._idle[tier].append(self._warm_pose(tier))
+                    self._created[tier] += 1
+            except Exception:
+                # E.g. the model can't be downloaded; instances are then created on first use
+                logging.exception(f"Could not pre-warm the '{tier}' tier, its Pose instances will be created on demand")
+
+    def _warm_pose(self, tier):
+        pose_instance = self._create_pose(tier)
+        pose_instance.process(np.zeros((256, 256, 3), dtype=np.uint8))
+        return pose_instance
+
+    # Function to clear the tracking state an instance kept from its last user, so
+    # results never depend on which video or session ran on it before. Restarting
+    # the graph makes the next frame slow again, so a blank frame is run through it here.
+    def _reset_pose(self, pose_instance):
+        pose_instance.reset()
+        pose_instance.process(np.zeros((256, 256, 3), dtype=np.uint8))
+
+    # Function to take a Pose instance of a tier out of the pool, for callers that
+    # hold it longer than one block of code. It must be given back with checkin().
+    def checkout(self, tier=DEFAULT_TIER):
+        tier_settings(tier)
+        with self._condition:
+            while not self._idle[tier] and self._created[tier] >= self.size:
+                self._condition.wait()
+            pose_instance = self._idle[tier].pop() if self._idle[tier] else None
+            if pose_instance is None:
+                self._created[tier] += 1
+
+        if pose_instance is None:
+            try:
+                pose_instance = self._warm_pose(tier)
+            except Exception:
+                with self._condition:
+                    self._created[tier] -= 1
+                    self._condition.notify()
+                raise
+        return pose_instance
+
+    def checkin(self, tier, pose_instance):
+        try:
+            self._reset_pose(pose_instance)
+        except Exception:
+            # Drop the broken instance, a new one is created when needed
+            logging.exception(f"Could not reset a '{tier}' Pose instance")
+            with self._condition:
+                self._created[tier] -= 1
+                self._condition.notify()
+            return
+        with self._condition:
+            self._idle[tier].append(pose_instance)
+            self._condition.notify()
+
+    # Context manager that lends out a Pose instance of a tier
+    @contextmanager
+    def acquire(self, tier=DEFAULT_TIER):
+        pose_instance = self.checkout(tier)
+        try:
+            yield pose_instance
+        finally:
+            self.checkin(tier, pose_instance)
+
+    def stats(self):
+        with self._condition:
+            return {tier: {'created': self._created[tier], 'idle': len(self._idle[tier])} for tier in QUALITY_TIERS}
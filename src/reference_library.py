@@ -0,0 +1,144 @@
+import argparse
+import json
+import logging
+import os
+import cv2
+import numpy as np
+import keypoint_cache
+
+# Folder holding one <template_id>.npz template and <template_id>.json metadata file
+# per template. An exercise can have many templates, e.g. one per performer.
+REFERENCE_DIR = os.environ.get(
+    'PROFORMAI_REFERENCE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'references')
+)
+
+# Function to name a template when the caller doesn't: the exercise and the start
+# of the video's hash, so rebuilding from the same video replaces its template
+# while another performer's video adds one
+def default_template_id(exercise_id, source_hash):
+    return f"{exercise_id}_{source_hash[:12]}"
+
+# Function to process a professional video once and store it as a reference template
+def build_template(video_path, exercise_id, side='left', reference_dir=None, template_id=None):
+    # Imported here so loading templates at server start does not pull in the ingestion code
+    from process_video import process_video
+    from extract_features_from_videos import extract_hand_vectors
+
+    keypoints = process_video(video_path)
+    if len(keypoints) == 0:
+        raise ValueError(f"No pose detected in reference video: {video_path}")
+
+    video = cv2.VideoCapture(video_path)
+    fps = video.get(cv2.CAP_PROP_FPS)
+    video.release()
+
+    source_hash = keypoint_cache.file_hash(video_path)
+    metadata = {
+        'template_id': template_id or default_template_id(exercise_id, source_hash),
+        'exercise_id': exercise_id,
+        'side': side,
+        'fps': fps,
+        'frames': len(keypoints),
+        'source': os.path.basename(video_path),
+        'source_hash': source_hash,
+    }
+
+    reference_dir = reference_dir or REFERENCE_DIR
+    os.makedirs(reference_dir, exist_ok=True)
+    base_path = os.path.join(reference_dir, metadata['template_id'])
+
+    np.savez(
+        base_path + '.npz',
+        keypoints=np.asarray(keypoints, dtype=np.float32),
+        vectors=extract_hand_vectors(keypoints, side).astype(np.float32)
+    )
+    with open(base_path + '.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+# A reference template: keypoints (frames, 33, 4), hand vectors (frames, 2, 2) and metadata
+class ReferenceTemplate:
+    def __init__(self, metadata, keypoints, vectors):
+        self.metadata = metadata
+        self.keypoints = keypoints
+        self.vectors = vectors
+
+    @property
+    def template_id(self):
+        return self.metadata['template_id']
+
+    @property
+    def exercise_id(self):
+        return self.metadata['exercise_id']
+
+    # Arm the template's hand vectors were taken from, 'left' or 'right'
+    @property
+    def side(self):
+        return self.metadata.get('side', 'left')
+
+# In-memory collection of reference templates, looked up by template ID or by exercise
+class ReferenceLibrary:
+    def __init__(self, reference_dir=None):
+        self.reference_dir = reference_dir or REFERENCE_DIR
+        self._templates = {}
+
+    # Function to (re)load every template in the reference folder
+    def load(self):
+        templates = {}
+        if os.path.isdir(self.reference_dir):
+            for file_name in sorted(os.listdir(self.reference_dir)):
+                if not file_name.endswith('.json'):
+                    continue
+                base_path = os.path.join(self.reference_dir, file_name[:-len('.json')])
+                try:
+                    with open(base_path + '.json') as f:
+                        metadata = json.load(f)
+                    # Templates from before template IDs are named after their exercise
+                    metadata.setdefault('template_id', os.path.basename(base_path))
+                    with np.load(base_path + '.npz') as data:
+                        template = ReferenceTemplate(metadata, data['keypoints'], data['vectors'])
+                except (OSError, ValueError, KeyError) as e:
+                    logging.error(f"Could not load reference template {base_path}: {str(e)}")
+                    continue
+                templates[template.template_id] = template
+
+        self._templates = templates
+        logging.info(f"Loaded {len(templates)} reference templates from {self.reference_dir}")
+        return self
+
+    def get(self, template_id):
+        return self._templates.get(template_id)
+
+    # Function to get every template of an exercise, ordered by template ID
+    def for_exercise(self, exercise_id):
+        templates = [template for template in self._templates.values() if template.exercise_id == exercise_id]
+        return sorted(templates, key=lambda template: template.template_id)
+
+    # Function to list the metadata of every template
+    def templates(self):
+        return [template.metadata for template in self._templates.values()]
+
+    def exercises(self):
+        return sorted({template.exercise_id for template in self._templates.values()})
+
+    def __contains__(self, exercise_id):
+        return any(template.exercise_id == exercise_id for template in self._templates.values())
+
+    def __len__(self):
+        return len(self._templates)
+
+# Example usage: python reference_library.py bicep_curl "D:\Temp downloads\p2copy.mp4" --template-id bicep_curl_coach
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build a reference template from a professional video.')
+    parser.add_argument('exercise_id')
+    parser.add_argument('video_path')
+    parser.add_argument('--side', choices=['left', 'right'], default='left')
+    parser.add_argument('--template-id', default=None,
+                        help='Name of the template (default: the exercise and the video hash)')
+    parser.add_argument('--reference-dir', default=None)
+    args = parser.parse_args()
+
+    metadata = build_template(args.video_path, args.exercise_id, args.side, args.reference_dir, args.template_id)
+    print(f"Saved reference template: {metadata}")
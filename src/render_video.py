@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+from video_pipeline import FrameReader, FrameWriter
+from job_queue import JobCancelled
+
+# Annotated-video rendering from saved landmarks. This needs no pose inference,
+# so it can run separately from (and long after) the analysis of a video.
+
+# Pairs of landmark indices joined by a line, same as Mediapipe's POSE_CONNECTIONS
+POSE_CONNECTIONS = [
+    (0, 1), (0, 4), (1, 2), (2, 3), (3, 7), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (11, 23), (12, 14), (12, 24), (13, 15), (14, 16),
+    (15, 17), (15, 19), (15, 21), (16, 18), (16, 20), (16, 22), (17, 19), (18, 20),
+    (23, 24), (23, 25), (24, 26), (25, 27), (26, 28), (27, 29), (27, 31),
+    (28, 30), (28, 32), (29, 31), (30, 32),
+]
+
+# Landmarks less visible than this are not drawn
+VISIBILITY_THRESHOLD = 0.5
+
+LINE_COLOR = (224, 224, 224)
+POINT_COLOR = (0, 138, 255)
+
+# Function to draw one (33, 4) landmark array (normalized x, y, z, visibility) on a frame
+def draw_pose(frame, landmarks):
+    height, width = frame.shape[:2]
+    points = np.round(landmarks[:, :2] * [width, height]).astype(int)
+    visible = landmarks[:, 3] >= VISIBILITY_THRESHOLD
+    thickness = max(1, round(width / 320))
+
+    for a, b in POSE_CONNECTIONS:
+        if visible[a] and visible[b]:
+            cv2.line(frame, tuple(points[a]), tuple(points[b]), LINE_COLOR, thickness)
+    for point in points[visible]:
+        cv2.circle(frame, tuple(point), thickness + 2, POINT_COLOR, -1)
+
+# Function to save the landmarks found by an analysis so the video can be rendered later.
+# frame_numbers are 1-based; landmarks has shape (len(frame_numbers), 33, 4) with
+# NaN rows for analysed frames where no pose was found.
+def save_landmarks(path, video_path, frame_numbers, landmarks):
+    np.savez(path, video_path=np.array(video_path), frame_numbers=np.asarray(frame_numbers, dtype=np.int64),
+             landmarks=np.asarray(landmarks, dtype=np.float32))
+
+def load_landmarks(path):
+    with np.load(path) as data:
+        return str(data['video_path']), data['frame_numbers'], data['landmarks']
+
+# Function to write an annotated copy of a video, optionally downscaled by scale.
+# Frames that were skipped during analysis get the landmarks of the last analysed frame.
+def render_video(video_path, output_path, frame_numbers, landmarks, scale=1.0, cancel_event=None):
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH) * scale) // 2 * 2
+    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT) * scale) // 2 * 2
+    output_writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+
+    reader = FrameReader(video).start()
+    writer = FrameWriter(output_writer, annotate=draw_pose).start()
+    frames_written = 0
+
+    try:
+        for frame_number, frame in reader:
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled()
+
+            if scale != 1.0:
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+            # Latest analysed frame at or before this one
+            index = np.searchsorted(frame_numbers, frame_number, side='right') - 1
+            frame_landmarks = landmarks[index] if index >= 0 else None
+            if frame_landmarks is not None and np.isnan(frame_landmarks[0, 0]):
+                frame_landmarks = None
+
+            writer.put(frame, frame_landmarks)
+            frames_written += 1
+    finally:
+        reader.stop()
+        writer.close()
+        video.release()
+        output_writer.release()
+
+    return {'output_path': output_path, 'frames': frames_written, 'width': width, 'height': height}
@@ -0,0 +1,128 @@
+import numpy as np
+from extract_features_from_videos import ARM_LANDMARKS, calculate_angles
+from frame_sampler import DEFAULT_TARGET_HZ
+
+# Moving-average window (in samples) applied to the elbow angle before looking for reps
+SMOOTHING_WINDOW = 5
+
+# A rep needs the elbow to open and close by at least this many degrees;
+# smaller swings are treated as noise
+MIN_RANGE_OF_MOTION = 40.0
+
+# Function to get the interior elbow angle (0-180 degrees) of every frame.
+# keypoints has shape (frames, 33, 2+).
+def elbow_angle_series(keypoints, side='left'):
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if keypoints.ndim != 3 or len(keypoints) == 0:
+        return np.empty(0, dtype=np.float32)
+
+    shoulder_index, elbow_index, wrist_index = ARM_LANDMARKS[side]
+    angles = calculate_angles(keypoints[:, shoulder_index, :2],
+                              keypoints[:, elbow_index, :2],
+                              keypoints[:, wrist_index, :2])
+    # calculate_angles returns 0-360, fold it onto the interior angle
+    return np.minimum(angles, 360 - angles)
+
+# Function to get the interior elbow angle from (upper arm, lower arm) hand vectors,
+# shape (frames, 2, 2), as produced by comparison.calculate_hand_vector
+def elbow_angles_from_vectors(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return np.empty(0, dtype=np.float32)
+
+    # The elbow angle lies between elbow->shoulder (-upper arm) and elbow->wrist (lower arm)
+    upper, lower = -vectors[:, 0], vectors[:, 1]
+    norms = np.linalg.norm(upper, axis=1) * np.linalg.norm(lower, axis=1)
+    cosines = np.einsum('ij,ij->i', upper, lower) / np.where(norms > 0, norms, 1)
+    return np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+
+# Function to smooth a signal with a centered moving average (edges are padded)
+def smooth(signal, window=SMOOTHING_WINDOW):
+    signal = np.asarray(signal, dtype=np.float64)
+    if window <= 1 or len(signal) < window:
+        return signal
+    padded = np.pad(signal, (window // 2, window - 1 - window // 2), mode='edge')
+    return np.convolve(padded, np.ones(window) / window, mode='valid')
+
+# Function to find the turning points of a signal that swing by at least min_range.
+# Local extrema are found in one vectorized pass over the slope; the short loop
+# afterwards only visits those extrema. Returns a list of (index, is_peak) pairs.
+# With final=False the last extremum is left out, since later samples may still move it.
+def turning_points(signal, min_range=MIN_RANGE_OF_MOTION, final=True):
+    if len(signal) < 2:
+        return []
+
+    # Direction of every step, carrying the last direction over flat stretches
+    slope = np.sign(np.diff(signal))
+    moving = np.flatnonzero(slope)
+    if len(moving) == 0:
+        return []
+    last_moving = np.maximum.accumulate(np.where(slope != 0, np.arange(len(slope)), moving[0]))
+    slope = slope[last_moving]
+
+    # Samples where the direction flips are local extrema; keep both ends too
+    flips = np.flatnonzero(slope[1:] != slope[:-1]) + 1
+    candidates = np.concatenate([[0], flips, [len(signal) - 1]])
+
+    turns = []
+    high = low = candidates[0]
+    direction = 0
+    for index in candidates[1:]:
+        value = signal[index]
+        if direction == 0:
+            if value > signal[high]:
+                high = index
+            if value < signal[low]:
+                low = index
+            if signal[high] - signal[low] >= min_range:
+                if high < low:
+                    turns.append((high, True))
+                    direction, pivot = -1, low
+                else:
+                    turns.append((low, False))
+                    direction, pivot = 1, high
+        elif direction == 1:
+            if value > signal[pivot]:
+                pivot = index
+            elif signal[pivot] - value >= min_range:
+                turns.append((pivot, True))
+                direction, pivot = -1, index
+        else:
+            if value < signal[pivot]:
+                pivot = index
+            elif value - signal[pivot] >= min_range:
+                turns.append((pivot, False))
+                direction, pivot = 1, index
+
+    if final and direction != 0:
+        turns.append((pivot, direction == 1))
+    return turns
+
+# Function to split an elbow angle series into repetitions.
+# A rep runs from one extended-arm peak through the curled valley to the next peak.
+# Times come from timestamps (seconds per sample) when given, else from sample_rate.
+def segment_reps(elbow_angles, sample_rate=DEFAULT_TARGET_HZ, timestamps=None,
+                 min_range=MIN_RANGE_OF_MOTION, window=SMOOTHING_WINDOW, final=True):
+    smoothed = smooth(elbow_angles, window)
+    if timestamps is None:
+        timestamps = np.arange(len(smoothed)) / sample_rate
+    turns = turning_points(smoothed, min_range, final)
+
+    reps = []
+    for (start, start_peak), (bottom, bottom_peak), (end, end_peak) in zip(turns, turns[1:], turns[2:]):
+        if not start_peak or bottom_peak or not end_peak:
+            continue
+        reps.append({
+            'start': int(start),
+            'bottom': int(bottom),
+            'end': int(end),
+            'range_of_motion': float(smoothed[start:end + 1].max() - smoothed[bottom]),
+            'duration': float(timestamps[end] - timestamps[start]),
+            'concentric': float(timestamps[bottom] - timestamps[start]),
+            'eccentric': float(timestamps[end] - timestamps[bottom]),
+        })
+    return reps
+
+# Function to turn reps into (start, end) sample ranges, end exclusive
+def rep_bounds(reps):
+    return [(rep['start'], rep['end'] + 1) for rep in reps]
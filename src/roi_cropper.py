@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+# Preprocessing in front of pose inference. Frames are cut down to the region
+# around the person found in the previous frame and scaled down to at most
+# inference_width pixels wide before colour conversion and pose.process, so
+# high-resolution uploads cost about the same as small ones. Landmarks are then
+# mapped back to normalized full-frame coordinates, so callers see no difference.
+
+# Width (in pixels) of the image given to pose.process; None keeps the full resolution
+DEFAULT_INFERENCE_WIDTH = 640
+
+# Space added around the person's landmarks, as a fraction of the larger side of their bounding box
+ROI_MARGIN = 0.3
+
+# Landmarks less visible than this don't count towards the bounding box
+ROI_MIN_VISIBILITY = 0.5
+
+# The crop is only moved when the person gets this close (as a fraction of the
+# margin) to its edge, or becomes much smaller than it, so it doesn't jitter
+# from frame to frame and MediaPipe's own tracking stays stable.
+ROI_EDGE_FRACTION = 0.5
+ROI_SHRINK_RATIO = 0.4
+
+# Crops narrower or shorter than this fraction of the frame (e.g. when every
+# visible landmark lies off one side of the frame) fall back to the whole frame
+ROI_MIN_SIZE = 0.05
+
+# Function to build the preprocessing settings that are part of the keypoint cache key
+def roi_settings(inference_width=DEFAULT_INFERENCE_WIDTH):
+    return {'inference_width': inference_width, 'margin': ROI_MARGIN, 'min_visibility': ROI_MIN_VISIBILITY,
+            'edge_fraction': ROI_EDGE_FRACTION, 'shrink_ratio': ROI_SHRINK_RATIO, 'min_size': ROI_MIN_SIZE}
+
+class PoseCropper:
+    def __init__(self, inference_width=DEFAULT_INFERENCE_WIDTH, margin=ROI_MARGIN):
+        self.inference_width = inference_width
+        self.margin = margin
+        # Current crop as normalized (x0, y0, x1, y1) of the full frame, None for the whole frame
+        self.roi = None
+        self._crop = None
+
+    # Function to crop, downscale and convert one BGR frame to the RGB image given to pose.process
+    def prepare(self, frame):
+        height, width = frame.shape[:2]
+        if self.roi is None:
+            x0, y0, x1, y1 = 0, 0, width, height
+        else:
+            x0, y0 = int(self.roi[0] * width), int(self.roi[1] * height)
+            x1, y1 = int(np.ceil(self.roi[2] * width)), int(np.ceil(self.roi[3] * height))
+            if x1 <= x0 or y1 <= y0:
+                x0, y0, x1, y1 = 0, 0, width, height
+        self._crop = (x0, y0, x1 - x0, y1 - y0, width, height)
+
+        image = frame[y0:y1, x0:x1]
+        if self.inference_width and x1 - x0 > self.inference_width:
+            scale = self.inference_width / (x1 - x0)
+            image = cv2.resize(image, (self.inference_width, max(1, round((y1 - y0) * scale))),
+                               interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    # Function to map the landmarks of pose.process results back to full-frame
+    # coordinates (in place) and move the crop for the next frame
+    def finish(self, results):
+        if not results.pose_landmarks:
+            # Lost the person, look at the whole frame again
+            self.roi = None
+            return results
+
+        x0, y0, crop_width, crop_height, width, height = self._crop
+        points = []
+        for landmark in results.pose_landmarks.landmark:
+            landmark.x = (landmark.x * crop_width + x0) / width
+            landmark.y = (landmark.y * crop_height + y0) / height
+            landmark.z = landmark.z * crop_width / width
+            if landmark.visibility >= ROI_MIN_VISIBILITY:
+                points.append((landmark.x, landmark.y))
+
+        self._update_roi(points)
+        return results
+
+    # Function to run pose_instance on a BGR frame through the crop
+    def process(self, pose_instance, frame):
+        return self.finish(pose_instance.process(self.prepare(frame)))
+
+    def _update_roi(self, points):
+        if len(points) < 2:
+            self.roi = None
+            return
+
+        points = np.array(points)
+        low, high = points.min(axis=0), points.max(axis=0)
+        pad = self.margin * (high - low).max()
+
+        if self.roi is not None:
+            roi_low, roi_high = np.array(self.roi[:2]), np.array(self.roi[2:])
+            edge = pad * ROI_EDGE_FRACTION
+            # Sides of the crop that are already at the frame border can't move further out
+            room_low = np.where(roi_low <= 0, np.inf, low - roi_low)
+            room_high = np.where(roi_high >= 1, np.inf, roi_high - high)
+            inside = np.all(room_low >= edge) and np.all(room_high >= edge)
+            box_area = np.prod(high - low + 2 * pad)
+            if inside and box_area >= ROI_SHRINK_RATIO * np.prod(roi_high - roi_low):
+                return
+
+        low = np.clip(low - pad, 0, 1)
+        high = np.clip(high + pad, 0, 1)
+        if np.any(high - low < ROI_MIN_SIZE):
+            self.roi = None
+            return
+        self.roi = (low[0], low[1], high[0], high[1])
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from comparison import dtw_align, analyze_vectors, frame_distances
+
+# Function to run textbook O(n * m) dynamic time warping, optionally limited to a band of columns per row
+def brute_force_dtw(user, reference, columns=None):
+    n, m = len(user), len(reference)
+    accumulated = np.full((n + 1, m + 1), np.inf)
+    accumulated[0, 0] = 0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if columns is not None and not columns[i - 1][0] <= j - 1 < columns[i - 1][1]:
+                continue
+            cost = frame_distances(user[i - 1], reference[j - 1])
+            accumulated[i, j] = cost + min(accumulated[i - 1, j - 1], accumulated[i - 1, j], accumulated[i, j - 1])
+    return accumulated[n, m]
+
+# Function to build (frames, 2, 2) hand vectors for an arm curling reps times
+def curl_vectors(reps, frames_per_rep=30):
+    t = np.arange(reps * frames_per_rep) / frames_per_rep
+    angle = np.radians(105 + 65 * np.cos(2 * np.pi * t))
+    upper = np.tile([0.0, 0.2], (len(t), 1))
+    lower = 0.2 * np.stack([-np.sin(angle), np.cos(angle)], axis=1)
+    return np.stack([upper, lower], axis=1).astype(np.float32)
+
+@pytest.mark.parametrize('n, m', [(1, 1), (1, 7), (7, 1), (12, 12), (15, 40), (40, 15), (33, 29)])
+def test_dtw_matches_brute_force_without_band(n, m):
+    rng = np.random.default_rng(n * 100 + m)
+    user = rng.normal(size=(n, 2, 2)).astype(np.float32)
+    reference = rng.normal(size=(m, 2, 2)).astype(np.float32)
+
+    alignment = dtw_align(user, reference, band=max(n, m))
+    assert alignment['distance'] == pytest.approx(brute_force_dtw(user, reference), rel=1e-5)
+
+@pytest.mark.parametrize('n, m, band', [(30, 30, 2), (25, 60, 3), (60, 25, 1), (50, 47, 5)])
+def test_dtw_matches_brute_force_within_band(n, m, band):
+    rng = np.random.default_rng(band)
+    user = rng.normal(size=(n, 2, 2)).astype(np.float32)
+    reference = rng.normal(size=(m, 2, 2)).astype(np.float32)
+
+    # Same band as dtw_align: centred on the scaled diagonal, never narrower than the slope
+    band = max(band, int(np.ceil(m / n)))
+    centers = np.rint(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(int)
+    columns = [(max(c - band, 0), min(c + band + 1, m)) for c in centers]
+
+    alignment = dtw_align(user, reference, band=band)
+    assert alignment['distance'] == pytest.approx(brute_force_dtw(user, reference, columns), rel=1e-5)
+
+def test_dtw_path_cost_adds_up_to_distance():
+    rng = np.random.default_rng(0)
+    user = rng.normal(size=(20, 2, 2)).astype(np.float32)
+    reference = rng.normal(size=(35, 2, 2)).astype(np.float32)
+
+    alignment = dtw_align(user, reference, band=35)
+    path = alignment['path']
+    assert tuple(path[0]) == (0, 0) and tuple(path[-1]) == (19, 34)
+    assert np.all(np.diff(path, axis=0) >= 0)
+    path_cost = frame_distances(user[path[:, 0]], reference[path[:, 1]]).sum()
+    assert path_cost == pytest.approx(alignment['distance'], rel=1e-5)
+
+def test_dtw_abandons_above_threshold():
+    user = curl_vectors(2)
+    assert dtw_align(user, user + 1, abandon_above=1.0) is None
+    assert dtw_align(user, user, abandon_above=1.0)['distance'] == pytest.approx(0)
+
+def test_many_reps_against_a_shorter_reference_have_no_deviation():
+    result = analyze_vectors(curl_vectors(20), curl_vectors(5))
+    assert len(result['reps']) >= 18
+    assert result['average_deviation'] == pytest.approx(0, abs=1e-6)
+    assert all(deviation == pytest.approx(0, abs=1e-6) for deviation in result['rep_deviations'])
+
+def test_reps_far_from_the_reference_are_abandoned():
+    user = curl_vectors(3)
+    user *= 10
+    result = analyze_vectors(user, curl_vectors(5), abandon_deviation=0.5)
+    assert result['reps'] and all(rep['abandoned'] for rep in result['reps'])
+    assert result['average_deviation'] == 0.5
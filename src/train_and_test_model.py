@@ -1,33 +1,18 @@
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
+import os
+import pickle
+import threading
 import numpy as np
-from process_video import process_videos_in_folder, process_video  # Process videos only once
-from extract_features_from_videos import extract_multiple_features  # Import the correct feature extraction function
-
-# Process correct and incorrect form videos only once
-print("Processing correct form videos...")
-<<<<<<< HEAD
-correct_keypoints = process_videos_in_folder(r'C:\Users\abhin\Desktop\ProFormAI\ProFormAI\src\Bicep Curls cor')
-
-print("Processing incorrect form videos...")
-incorrect_keypoints = process_videos_in_folder(r'C:\Users\abhin\Desktop\ProFormAI\ProFormAI\src\Bicep Curls cor')
-=======
-correct_keypoints = process_videos_in_folder('D:\\ProFormAI\\ProFormAI\\src\\Bicep Curls cor')
-
-print("Processing incorrect form videos...")
-incorrect_keypoints = process_videos_in_folder('D:\\ProFormAI\\ProFormAI\\src\\Bicep Curls incor')
->>>>>>> 3654dfda007a14132494bb50e136f94f24006cc9
-
-# Extract features only once
-print("Extracting features for correct form...")
-correct_features = extract_multiple_features(correct_keypoints)
-
-print("Extracting features for incorrect form...")
-incorrect_features = extract_multiple_features(incorrect_keypoints)
+from process_video import process_videos
+from quality_tiers import DEFAULT_TIER
+from extract_features_from_videos import extract_frame_features  # Import the correct feature extraction function
 
 # Train the model on correct and incorrect features
 def train_model(correct_features, incorrect_features):
+    # scikit-learn is imported here so importing this module stays fast
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import accuracy_score, classification_report
+
     # Filter out invalid features (e.g., NaN values)
     correct_features = [f for f in correct_features if not np.isnan(f).any()]
     incorrect_features = [f for f in incorrect_features if not np.isnan(f).any()]
@@ -60,35 +45,77 @@ def train_model(correct_features, incorrect_features):
 
     return clf
 
-
-# Predict whether the video is a bicep curl or not and return the likelihood
-def predict_bicep_curls(model, video_path):
-    keypoints = process_video(video_path)  # Extract keypoints from the video
-    if len(keypoints) == 0:
-        return 0.0  # If no keypoints are detected
-
-    features = extract_multiple_features([keypoints])  # Extract multiple features from the test video
-    if len(features) == 0:
-        return 0.0  # No valid features extracted
-
-    prediction = model.predict_proba(features)  # Get probability of being a bicep curl
-
+# Save a trained model so scoring does not have to retrain it
+def save_model(model, model_path):
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+
+# Load a model saved with save_model
+def load_model(model_path):
+    with open(model_path, 'rb') as f:
+        return pickle.load(f)
+
+# Models loaded through get_model stay resident, one per path per process
+_resident_models = {}
+_resident_models_lock = threading.Lock()
+
+# Function to get a saved model, loading it from disk only the first time
+def get_model(model_path):
+    model_path = os.path.abspath(model_path)
+    with _resident_models_lock:
+        if model_path not in _resident_models:
+            _resident_models[model_path] = load_model(model_path)
+        return _resident_models[model_path]
+
+# Function to pick the bicep curl probability out of predict_proba output
+def _curl_probability(prediction):
     # Return the probability of the video being a bicep curl (1 corresponds to bicep curls class)
-    if len(prediction[0]) > 1:
-        return prediction[0][1]  # Return class 1 (bicep curl)
+    if prediction.shape[1] > 1:
+        return prediction[:, 1]  # Return class 1 (bicep curl)
     else:
-        return prediction[0][0]  # If only one class is returned, use class 0
-
+        return prediction[:, 0]  # If only one class is returned, use class 0
+
+# Predict the likelihood of being a bicep curl for many videos at once.
+# Each item of videos is a video path, a (frames, 33, 4) keypoint array, or a
+# precomputed feature row. Paths are processed with process_videos (across
+# `workers` processes, at the given quality tier); the model is then called once
+# on the stacked features.
+# Returns one likelihood per item, 0.0 where no valid features could be extracted
+# (including videos that could not be read).
+def predict_bicep_curls_batch(model, videos, workers=1, tier=DEFAULT_TIER):
+    videos = list(videos)
+
+    # Run pose extraction for all the paths together; a video that fails is logged and scores 0.0
+    path_indices = [i for i, video in enumerate(videos) if isinstance(video, (str, os.PathLike))]
+    paths = [videos[i] for i in path_indices]
+    keypoints = process_videos(paths, workers=workers, tier=tier, skip_failed=True) if paths else []
+    for index, video_keypoints in zip(path_indices, keypoints):
+        videos[index] = video_keypoints
+
+    # One feature row per video, NaN where there is nothing to score
+    features = np.full((len(videos), 2), np.nan)
+    for i, video in enumerate(videos):
+        video = np.asarray(video, dtype=np.float32)
+        if video.ndim == 1:
+            features[i] = video  # Precomputed features
+        else:
+            frame_features = extract_frame_features(video)
+            if len(frame_features):
+                features[i] = frame_features.mean(axis=0)
+
+    likelihoods = np.zeros(len(videos))
+    valid = ~np.isnan(features).any(axis=1)
+    if valid.any():
+        likelihoods[valid] = _curl_probability(model.predict_proba(features[valid]))
+    return likelihoods
 
-# Example usage: Predict the likeliness of a new video being bicep curls
-if __name__ == "__main__":
-    test_video_path = 'D:\\ProFormAI\\ProFormAI\\src\\testing\\f1.mp4'
+# Predict whether the video is a bicep curl or not and return the likelihood
+def predict_bicep_curls(model, video_path, tier=DEFAULT_TIER):
+    return predict_bicep_curls_batch(model, [video_path], tier=tier)[0]
 
-    # Train the model
-    print("Training the model...")
-    model = train_model(correct_features, incorrect_features)
 
-    # Predict likeliness
-    print(f"Processing test video: {test_video_path}")
-    likeliness = predict_bicep_curls(model, test_video_path)
-    print(f'Likeliness of the video being bicep curls: {likeliness * 100:.2f}%')
+# Example usage: train the model, then predict the likeliness of a new video being bicep curls
+if __name__ == "__main__":
+    from pipeline import main
+    main(['all'])
+    main(['evaluate'])
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from metrics import stage_seconds
+
+# How many frames may wait between two pipeline stages.
+# Memory use is bounded by this rather than by the length of the video.
+PIPELINE_QUEUE_DEPTH = 8
+
+# Marker put on a queue after the last frame
+_END = object()
+
+# Decode stage: reads frames from an open cv2.VideoCapture on its own thread.
+# OpenCV releases the GIL while decoding, so this overlaps with pose inference.
+# Iterating over the reader yields (frame_number, frame) pairs, starting at
+# first_frame (1 unless the video was seeked before the reader was started).
+class FrameReader:
+    def __init__(self, video, queue_depth=PIPELINE_QUEUE_DEPTH, first_frame=1):
+        self._video = video
+        self._first_frame = first_frame
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='frame-reader', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _put(self, item):
+        # Use a timeout so the thread notices stop() even when the queue is full
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        frame_number = self._first_frame - 1
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = self._video.read()
+                if not ret:
+                    break
+                stage_seconds.observe(time.perf_counter() - start, 'decode')
+                frame_number += 1
+                if not self._put((frame_number, frame)):
+                    return
+        finally:
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # Function to stop reading early and wait for the decode thread to exit
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+# Annotate/encode stage: draws on frames and writes them to a cv2.VideoWriter
+# on its own thread. annotate(frame, data) is called before each write when
+# data is not None.
+class FrameWriter:
+    def __init__(self, output_writer, annotate=None, queue_depth=PIPELINE_QUEUE_DEPTH):
+        self._output_writer = output_writer
+        self._annotate = annotate
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='frame-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                # Keep draining so put() never blocks after a failure
+                continue
+            frame, data = item
+            try:
+                if self._annotate is not None and data is not None:
+                    with stage_seconds.time('draw'):
+                        self._annotate(frame, data)
+                with stage_seconds.time('encode'):
+                    self._output_writer.write(frame)
+            except Exception as e:
+                self._error = e
+
+    # Function to queue a frame for writing, blocks when the writer falls behind
+    def put(self, frame, data=None):
+        self._queue.put((frame, data))
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # Function to flush the remaining frames and wait for the encode thread
+    def close(self):
+        self._queue.put(_END)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error